@@ -1,44 +1,89 @@
-import os
-
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
-from flask_bcrypt import Bcrypt
-
-# Get the directory where the script is located. This is used to set up the database path.
-basedir = os.path.abspath(os.path.dirname(__file__))
-
-# Initialize the Flask application
-app = Flask(__name__)
-
-# Load configurations from the 'config' module inside the 'app' package.
-app.config.from_object('app.config.Config')
-
-# Initialize SQLAlchemy for database operations
-db = SQLAlchemy()
-
-# Initialize Bcrypt for password hashing
-bc = Bcrypt(app)
-
-# Initialize LoginManager for user authentication
-lm = LoginManager()
-lm.init_app(app)
-
-
-# database setup
-# @app.before_first_request
-# def initialize_database():
-#     db.create_all() depreciated
-
-# Setup the database within the application context.
-# This replaces the deprecated 'initialize_database' function, ensuring that the database is ready when the app starts.
-with app.app_context():
-    db.init_app(app)
-    db.create_all()
-    
-
-
-
-# Import views and models from the 'app' package. 
-# This is necessary to ensure that Flask knows about the routes and database models you've defined.
-from app import views, models
+import os
+import threading
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager
+from flask_bcrypt import Bcrypt
+
+# Get the directory where the script is located. This is used to set up the database path.
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# Extensions are created unbound so that importing the package (e.g. for the models) has no side effects.
+# create_app() binds them to an application.
+
+# Initialize SQLAlchemy for database operations
+db = SQLAlchemy()
+
+# Initialize Bcrypt for password hashing
+bc = Bcrypt()
+
+# Initialize LoginManager for user authentication
+lm = LoginManager()
+
+
+def create_app(config_object='app.config.Config', start_services=None):
+    """
+    Application factory. Creates and configures the Flask application, registers the routes and CLI commands,
+    and makes sure the database tables exist and are up to date.
+
+    The crawl services (request queue, worker pool, revisit scheduler) are created lazily on first use and do not
+    run unless asked to, so CLI tools and tests get an application without background threads. With START_CRAWLER
+    enabled they start when the application serves its first request, never in CLI commands such as 'flask reparse'
+    or 'flask shell' that load the same application without serving it.
+
+    Args:
+    config_object (str or object): The configuration to load. Defaults to 'app.config.Config'.
+    start_services (bool): True starts the crawl services immediately, False never starts them. Defaults to
+    starting them on the first request if START_CRAWLER is set.
+
+    Returns:
+    Flask: The configured application.
+    """
+    app = Flask(__name__)
+
+    # Load configurations from the 'config' module inside the 'app' package.
+    app.config.from_object(config_object)
+
+    db.init_app(app)
+    bc.init_app(app)
+    lm.init_app(app)
+
+    # Import views and models from the 'app' package.
+    # This is necessary to ensure that Flask knows about the routes and database models you've defined.
+    from app import models
+    from app.views import bp
+    from app.commands import register_commands
+    from app.services.crawl_services import CrawlServices
+    from app.utils.logger import logger
+
+    app.register_blueprint(bp)
+    register_commands(app)
+    app.extensions['crawl_services'] = CrawlServices(app)
+
+    # Setup the database within the application context.
+    with app.app_context():
+        db.create_all()
+        for change in models.upgrade_schema():
+            logger.info(f"Database upgraded: {change}")
+
+    if start_services:
+        app.extensions['crawl_services'].start()
+    elif start_services is None and app.config['START_CRAWLER']:
+        _start_on_first_request(app)
+
+    return app
+
+
+def _start_on_first_request(app):
+    """ Starts the crawl services of an application once, when it handles its first request. """
+    lock = threading.Lock()
+    started = []
+
+    @app.before_request
+    def start_crawl_services():
+        if not started:
+            with lock:
+                if not started:
+                    started.append(True)
+                    app.extensions['crawl_services'].start()
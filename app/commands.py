@@ -0,0 +1,83 @@
+import click
+from flask import current_app
+
+from app.models import CrawledData, ExtractionProfile, db
+from app.services.crawl_services import get_services
+from app.utils.logger import set_log_role
+
+
+def _apply_batch(batch):
+    """
+    Writes a batch of re-parsed pages back to CrawledData in a single transaction.
+
+    Args:
+    batch (list): Extraction result dictionaries keyed by 'url'. Each row gets the fields captured by its own
+    user's profile.
+
+    Returns:
+    int: The number of rows that were updated.
+    """
+    by_url = {result['url']: result for result in batch}
+    rows = CrawledData.query.filter(CrawledData.url.in_(list(by_url))).all()
+    for row in rows:
+        result = by_url[row.url]
+        row.title = result['title']
+        row.content = result['content']
+        row.links = ','.join(result['links']) if result['links'] else ''
+        row.extracted = result.get('extracted_by_user', {}).get(row.user_id)
+    db.session.commit()
+    return len(rows)
+
+
+@click.command('reparse')
+@click.option('--archive-dir', default=None, help='WARC archive directory. Defaults to the WARC_DIR setting.')
+@click.option('--processes', default=None, type=int, help='Number of parser processes. Defaults to the CPU count.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows updated per database transaction.')
+def reparse(archive_dir, processes, batch_size):
+    """
+    Re-runs page extraction, including the current extraction profiles, over the raw response archive and updates
+    CrawledData, without fetching anything.
+    """
+    from app.services.warc_archive import reparse_archive
+
+    set_log_role('reparse')
+    archive_dir = archive_dir or current_app.config['WARC_DIR']
+    profiles = {(profile.user_id, profile.domain): (profile.updated_at, profile.rules)
+                for profile in ExtractionProfile.query.filter_by(enabled=True)}
+    batch, parsed, updated = [], 0, 0
+    for result in reparse_archive(archive_dir, processes=processes, profiles=profiles,
+                                  html_types=current_app.config['CRAWL_HTML_TYPES']):
+        batch.append(result)
+        parsed += 1
+        if len(batch) >= batch_size:
+            updated += _apply_batch(batch)
+            batch = []
+    if batch:
+        updated += _apply_batch(batch)
+    click.echo(f'Re-parsed {parsed} archived pages, updated {updated} rows.')
+
+
+@click.command('crawl')
+def crawl():
+    """
+    Runs the crawl workers and revisit scheduler in this process until interrupted. Use it to crawl from a
+    dedicated worker process; the web process only runs crawl workers itself when START_CRAWLER is set.
+    """
+    set_log_role('crawl')
+    services = get_services()
+    services.start()
+    click.echo(f"Crawler running with {current_app.config['CRAWL_WORKERS']} workers, press Ctrl+C to stop.")
+    try:
+        # Runs until interrupted; controls from the web process pause, stop and resume the workers meanwhile
+        while not services.worker_pool.shutdown_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    services.stop()
+    click.echo('Crawler stopped.')
+
+
+def register_commands(app):
+    """ Registers the application's CLI commands. """
+    app.cli.add_command(reparse)
+    app.cli.add_command(crawl)
@@ -1,40 +1,131 @@
-import os
-from decouple import config
-import redis
-
-basedir = os.path.abspath(os.path.dirname(__file__))
-
-
-class Config:
-    """
-    Configuration class for the Flask application.
-
-    This class contains settings and configurations used by the Flask application, such as secret keys, 
-    database connection details, and other related settings.
-
-    Attributes:
-    SECRET_KEY (str): A secret key used for securely signing the session cookie in Flask. 
-                      It can be set from environment variables using 'decouple.config'.
-                      Defaults to 's4cret_123' if not set in the environment.
-    SQLALCHEMY_DATABASE_URI (str): Database URI for SQLAlchemy. Points to a SQLite database in the project directory.
-    SQLALCHEMY_TRACK_MODIFICATIONS (bool): Flag to enable or disable track modifications feature in SQLAlchemy. 
-                                           Set to False to disable it and improve performance.
-    redis_host (str): Host address for the Redis server. Replace with the actual IP address or hostname.
-    redis_port (int): Port number for the Redis server.
-    r (redis.Redis): Redis client instance, connected to the specified host and port.
-
-    The configurations can be adjusted according to the deployment requirements of the application.
-    """
-    # CSRF_ENABLED = True
-    # set up a secretkey/passcode
-    SECRET_KEY = config('SECRET_KEY', default='s4cret_123')
-
-    # db URI
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'db.sqlite3')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-
-    redis_host = "172.28.9.74"  # Replace with the actual IP address
-    redis_port = 6379
-    r = redis.Redis(host=redis_host, port=redis_port)
-
-    
+import os
+from decouple import config, Csv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+class Config:
+    """
+    Configuration class for the Flask application.
+
+    This class contains settings and configurations used by the Flask application, such as secret keys, 
+    database connection details, and other related settings.
+
+    Attributes:
+    SECRET_KEY (str): A secret key used for securely signing the session cookie in Flask. 
+                      It can be set from environment variables using 'decouple.config'.
+                      Defaults to 's4cret_123' if not set in the environment.
+    SQLALCHEMY_DATABASE_URI (str): Database URI for SQLAlchemy. Points to a SQLite database in the project directory.
+    SQLALCHEMY_TRACK_MODIFICATIONS (bool): Flag to enable or disable track modifications feature in SQLAlchemy. 
+                                           Set to False to disable it and improve performance.
+    REDIS_HOST (str): Host address for the Redis server that backs the request queue.
+    REDIS_PORT (int): Port number for the Redis server.
+    REDIS_DB (int): Redis database number used by the request queue.
+    START_CRAWLER (bool): Whether the web process also runs the crawl workers, started on its first request.
+                          Defaults to False: crawling runs in a separate 'flask crawl' worker process.
+    CRAWL_WORKERS (int): Number of crawl worker threads at start.
+    AUTOSCALE_ENABLED (bool): Whether the worker pool is resized between CRAWL_MIN_WORKERS and CRAWL_MAX_WORKERS.
+    CRAWL_MIN_WORKERS (int): Smallest number of crawl worker threads the autoscaler shrinks to.
+    CRAWL_MAX_WORKERS (int): Largest number of crawl worker threads the autoscaler grows to.
+    AUTOSCALE_INTERVAL (int): Seconds between autoscaler decisions.
+    AUTOSCALE_TARGET_LATENCY (float): Median task latency in seconds above which the pool is halved.
+    AUTOSCALE_MAX_ERROR_RATE (float): Fraction of tasks failing with a timeout, connection error, 5xx or 429 above
+                                      which the pool is halved.
+    AUTOSCALE_MAX_CPU (float): Fraction of one CPU core used by the crawler process above which the pool is halved.
+    AUTOSCALE_MAX_RSS_MB (int): Resident memory in megabytes above which the pool is halved.
+    AUTOSCALE_COOLDOWN (int): Minimum number of seconds between two halvings.
+    EXTRACTION_CACHE_SIZE (int): Number of compiled per-user, per-domain extraction profiles kept in memory.
+    EXTRACTION_CACHE_TTL (int): Seconds after which a cached extraction profile is checked for changes.
+    PROFILE_ENABLED (bool): Whether the crawl task profiler is enabled when the crawler starts. It can also be
+                            toggled at runtime for every crawler process through POST /crawler/profiler.
+    PROFILE_SAMPLE_RATE (float): Fraction of crawl tasks profiled while the profiler is enabled.
+    PROFILE_INTERVAL (float): Seconds between two stack samples of a profiled task.
+    PROFILE_FLUSH_INTERVAL (int): Seconds between two writes of the collected stacks.
+    PROFILE_DIR (str): Directory where profiling sessions write their collapsed-stack files.
+    FEED_CAPACITY (int): Number of recent crawl results kept per user for the live feed.
+    FEED_PROGRESS_INTERVAL (int): Seconds between queue progress events on the live feed.
+    ARCHIVE_RESPONSES (bool): When True, raw crawl responses are written to WARC files so they can be re-parsed later.
+    WARC_DIR (str): Directory where WARC files and their offset index are stored.
+    WARC_MAX_BYTES (int): Size in bytes after which a WARC file is rotated.
+    CRAWL_DELAY (float): Minimum number of seconds between two requests to the same host.
+    CRAWL_MAX_HTML_BYTES (int): Byte budget for HTML pages; bodies are truncated there before parsing.
+    CRAWL_MAX_MEDIA_BYTES (int): Largest media file downloaded; bigger responses are skipped from their headers.
+    CRAWL_HTML_TYPES (tuple): Content types parsed as HTML pages.
+    CRAWL_MEDIA_TYPES (tuple): Content type prefixes downloaded as media files. Anything else is skipped.
+    REVISIT_ENABLED (bool): Whether the background revisit scheduler re-enqueues crawled pages.
+    REVISIT_BUDGET_PER_HOUR (int): Global budget of revisit fetches per hour.
+    REVISIT_MIN_INTERVAL (int): Shortest revisit interval in seconds.
+    REVISIT_MAX_INTERVAL (int): Longest revisit interval in seconds.
+    REVISIT_POLL_INTERVAL (int): Seconds between revisit scheduler ticks.
+    SITEMAP_MAX_URLS (int): Maximum number of URLs enqueued by one sitemap discovery run.
+    SITEMAP_MAX_FILES (int): Maximum number of sitemap files fetched by one sitemap discovery run.
+
+    The configurations can be adjusted according to the deployment requirements of the application.
+    """
+    # CSRF_ENABLED = True
+    # set up a secretkey/passcode
+    SECRET_KEY = config('SECRET_KEY', default='s4cret_123')
+
+    # db URI
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'db.sqlite3')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Only connection settings live here; the Redis client is created when the request queue is first used
+    REDIS_HOST = config('REDIS_HOST', default='localhost')
+    REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
+    REDIS_DB = config('REDIS_DB', default=1, cast=int)
+
+    # crawl workers
+    START_CRAWLER = config('START_CRAWLER', default=False, cast=bool)
+    CRAWL_WORKERS = config('CRAWL_WORKERS', default=5, cast=int)
+
+    # worker pool autoscaling
+    AUTOSCALE_ENABLED = config('AUTOSCALE_ENABLED', default=True, cast=bool)
+    CRAWL_MIN_WORKERS = config('CRAWL_MIN_WORKERS', default=1, cast=int)
+    CRAWL_MAX_WORKERS = config('CRAWL_MAX_WORKERS', default=20, cast=int)
+    AUTOSCALE_INTERVAL = config('AUTOSCALE_INTERVAL', default=5, cast=int)
+    AUTOSCALE_TARGET_LATENCY = config('AUTOSCALE_TARGET_LATENCY', default=8.0, cast=float)
+    AUTOSCALE_MAX_ERROR_RATE = config('AUTOSCALE_MAX_ERROR_RATE', default=0.3, cast=float)
+    AUTOSCALE_MAX_CPU = config('AUTOSCALE_MAX_CPU', default=0.9, cast=float)
+    AUTOSCALE_MAX_RSS_MB = config('AUTOSCALE_MAX_RSS_MB', default=1024, cast=int)
+    AUTOSCALE_COOLDOWN = config('AUTOSCALE_COOLDOWN', default=30, cast=int)
+
+    # raw response archive
+    ARCHIVE_RESPONSES = config('ARCHIVE_RESPONSES', default=False, cast=bool)
+    WARC_DIR = config('WARC_DIR', default=os.path.abspath(os.path.join(basedir, '..', 'warc_archive')))
+    WARC_MAX_BYTES = config('WARC_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)
+
+    # politeness
+    CRAWL_DELAY = config('CRAWL_DELAY', default=2, cast=float)
+
+    # revisit scheduler
+    REVISIT_ENABLED = config('REVISIT_ENABLED', default=True, cast=bool)
+    REVISIT_BUDGET_PER_HOUR = config('REVISIT_BUDGET_PER_HOUR', default=600, cast=int)
+    REVISIT_MIN_INTERVAL = config('REVISIT_MIN_INTERVAL', default=3600, cast=int)
+    REVISIT_MAX_INTERVAL = config('REVISIT_MAX_INTERVAL', default=30 * 86400, cast=int)
+    REVISIT_POLL_INTERVAL = config('REVISIT_POLL_INTERVAL', default=60, cast=int)
+
+    # sitemap discovery
+    SITEMAP_MAX_URLS = config('SITEMAP_MAX_URLS', default=50000, cast=int)
+    SITEMAP_MAX_FILES = config('SITEMAP_MAX_FILES', default=500, cast=int)
+
+    # response gating
+    CRAWL_MAX_HTML_BYTES = config('CRAWL_MAX_HTML_BYTES', default=2 * 1024 * 1024, cast=int)
+    CRAWL_MAX_MEDIA_BYTES = config('CRAWL_MAX_MEDIA_BYTES', default=50 * 1024 * 1024, cast=int)
+    CRAWL_HTML_TYPES = config('CRAWL_HTML_TYPES', default='text/html,application/xhtml+xml', cast=Csv(post_process=tuple))
+    CRAWL_MEDIA_TYPES = config('CRAWL_MEDIA_TYPES', default='image/,application/', cast=Csv(post_process=tuple))
+
+    # extraction profiles
+    EXTRACTION_CACHE_SIZE = config('EXTRACTION_CACHE_SIZE', default=256, cast=int)
+    EXTRACTION_CACHE_TTL = config('EXTRACTION_CACHE_TTL', default=60, cast=int)
+
+    # task profiler
+    PROFILE_ENABLED = config('PROFILE_ENABLED', default=False, cast=bool)
+    PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.05, cast=float)
+    PROFILE_INTERVAL = config('PROFILE_INTERVAL', default=0.005, cast=float)
+    PROFILE_FLUSH_INTERVAL = config('PROFILE_FLUSH_INTERVAL', default=30, cast=int)
+    PROFILE_DIR = config('PROFILE_DIR', default=os.path.abspath(os.path.join(basedir, '..', 'crawl_profiles')))
+
+    # live result feed
+    FEED_CAPACITY = config('FEED_CAPACITY', default=100, cast=int)
+    FEED_PROGRESS_INTERVAL = config('FEED_PROGRESS_INTERVAL', default=5, cast=int)
@@ -1,122 +1,308 @@
-from app import db
-from flask_login import UserMixin
-
-
-class Users(db.Model, UserMixin):
-    """
-    Represents a user in the application. This class is a model that defines the structure of the 'Users' table in the database.
-
-    Attributes:
-        id (int): Unique identifier for the user.
-        firstname (str): First name of the user.
-        lastname (str): Last name of the user.
-        user (str): Username of the user.
-        email (str): Email address of the user.
-        password (str): Hashed password of the user.
-        crawleddata (relationship): Relationship to the CrawledData model.
-    """
-
-    __tablename__ = 'Users'
-
-    id = db.Column(db.Integer, primary_key=True)
-    firstname = db.Column(db.String(60))
-    lastname = db.Column(db.String(20))
-    user = db.Column(db.String(64), unique=True)
-    email = db.Column(db.String(120), unique=True)
-    password = db.Column(db.String(500))
-    crawleddata = db.relationship('CrawledData', backref='user', lazy=True)
-
-    def __init__(self, firstname, lastname, user, email, password):
-        self.firstname = firstname
-        self.lastname = lastname
-        self.user = user
-        self.email = email
-        self.password = password
-
-    def __repr__(self):
-        return str(self.id) + ' - ' + str(self.user)
-
-    def save(self):
-        db.session.add(self)
-        db.session.commit()
-
-        return self
-    
-
-class CrawledData(db.Model):
-    """
-    Represents crawled data associated with a user. This class defines the structure of the 'CrawledData' table in the database.
-
-    Attributes:
-        id (int): Unique identifier for the crawled data.
-        user_id (int): Foreign key to the Users table.
-        url (str): URL of the crawled data.
-        title (str): Title of the crawled page or data.
-        content (str): Content extracted from the crawled page.
-        file_path (str): File path where crawled data is stored (if applicable).
-        content_type (str): Type of content crawled.
-        links (PickleType): Serialized list of links found in the crawled content.
-    """
-    
-    __tablename__ = 'CrawledData'
-
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('Users.id'), nullable=False)
-    url = db.Column(db.String(500), unique=True, nullable=False)
-    title = db.Column(db.String(300), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    file_path = db.Column(db.String, nullable=True)
-    content_type = db.Column(db.String, nullable=True)
-    links = db.Column(db.PickleType, nullable=True)  # Storing list of links as serialized data
-
-    def __init__(self, user_id, url, title, content,file_path, content_type, links):
-        self.user_id = user_id
-        self.url = url
-        self.title = title
-        self.content = content
-        self.file_path = file_path
-        self.content_type = content_type
-        self.links = links
-    
-    def __repr__(self):
-        return f"{self.id} - User: {self.user_id} - URL: {self.url}"
-    
-    def save(self):
-        db.session.add(self) 
-        print('added to db waiting to commit')
-        db.session.commit()
-        return self
-
-
-    
-
-
-
-class Data(db.Model):
-    """
-    Represents generic data stored in the application. This class is a model that defines the structure of the 'Data' table in the database.
-
-    Attributes:
-        id (int): Unique identifier for the data entry.
-        version (str): Version of the data or related application component.
-        status (str): Status associated with the data.
-        error_code (int): Error code associated with the data, if applicable.
-    """
-
-    __tablename__ = 'Data'
-
-    id = db.Column(db.Integer, primary_key=True)
-    version = db.Column(db.String(12), unique=True)
-    status = db.Column(db.String(7))
-    error_code = db.Column(db.Integer)
-
-    def __init__(self, version, status, error_code):
-        self.version = version
-        self.status = status
-        self.error_code = error_code
-    
-    def save(self):
-        db.session.add(self)
-        db.session.commit()
-
+from datetime import datetime
+
+from app import db
+from flask_login import UserMixin
+from sqlalchemy import inspect, text
+
+
+class Users(db.Model, UserMixin):
+    """
+    Represents a user in the application. This class is a model that defines the structure of the 'Users' table in the database.
+
+    Attributes:
+        id (int): Unique identifier for the user.
+        firstname (str): First name of the user.
+        lastname (str): Last name of the user.
+        user (str): Username of the user.
+        email (str): Email address of the user.
+        password (str): Hashed password of the user.
+        crawleddata (relationship): Relationship to the CrawledData model.
+    """
+
+    __tablename__ = 'Users'
+
+    id = db.Column(db.Integer, primary_key=True)
+    firstname = db.Column(db.String(60))
+    lastname = db.Column(db.String(20))
+    user = db.Column(db.String(64), unique=True)
+    email = db.Column(db.String(120), unique=True)
+    password = db.Column(db.String(500))
+    crawleddata = db.relationship('CrawledData', backref='user', lazy=True)
+
+    def __init__(self, firstname, lastname, user, email, password):
+        self.firstname = firstname
+        self.lastname = lastname
+        self.user = user
+        self.email = email
+        self.password = password
+
+    def __repr__(self):
+        return str(self.id) + ' - ' + str(self.user)
+
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
+        return self
+    
+
+class CrawledData(db.Model):
+    """
+    Represents crawled data associated with a user. This class defines the structure of the 'CrawledData' table in the database.
+    A URL is stored once per user, so users crawling the same page each get their own row.
+
+    Attributes:
+        id (int): Unique identifier for the crawled data.
+        user_id (int): Foreign key to the Users table.
+        url (str): URL of the crawled data.
+        title (str): Title of the crawled page or data.
+        content (str): Content extracted from the crawled page.
+        file_path (str): File path where crawled data is stored (if applicable).
+        content_type (str): Type of content crawled.
+        links (PickleType): Serialized list of links found in the crawled content.
+        etag (str): ETag header of the last fetched response, sent back as If-None-Match on recrawl.
+        last_modified (str): Last-Modified header of the last fetched response, sent back as If-Modified-Since on recrawl.
+        content_hash (str): SHA-256 of the last fetched body, used to detect unchanged pages that lack validators.
+        last_checked (datetime): When the URL was last fetched or revalidated.
+        extracted (JSON): Fields captured by the extraction profile of the URL's domain, keyed by rule name.
+    """
+    
+    __tablename__ = 'CrawledData'
+    __table_args__ = (db.UniqueConstraint('user_id', 'url'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('Users.id'), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    title = db.Column(db.String(300), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    file_path = db.Column(db.String, nullable=True)
+    content_type = db.Column(db.String, nullable=True)
+    links = db.Column(db.PickleType, nullable=True)  # Storing list of links as serialized data
+    etag = db.Column(db.String(200), nullable=True)
+    last_modified = db.Column(db.String(64), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    last_checked = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    extracted = db.Column(db.JSON, nullable=True)
+
+    def __init__(self, user_id, url, title, content,file_path, content_type, links,
+                 etag=None, last_modified=None, content_hash=None, extracted=None):
+        self.user_id = user_id
+        self.url = url
+        self.title = title
+        self.content = content
+        self.file_path = file_path
+        self.content_type = content_type
+        self.links = links
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.extracted = extracted
+        self.last_checked = datetime.utcnow()
+    
+    def __repr__(self):
+        return f"{self.id} - User: {self.user_id} - URL: {self.url}"
+
+    def validators(self):
+        """ Returns the cache validators stored for this URL, used to make a conditional recrawl. """
+        return {
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_hash': self.content_hash,
+        }
+
+    def update_from(self, result):
+        """ Updates the row in place from a changed page returned by WebCrawler.crawl. """
+        self.title = result['title']
+        self.content = result['content']
+        self.file_path = result['file_path'] if result['file_path'] else ''
+        self.content_type = result['content-type']
+        self.links = ','.join(result['links']) if result['links'] else ''
+        self.etag = result.get('etag')
+        self.last_modified = result.get('last_modified')
+        self.content_hash = result.get('content_hash')
+        self.extracted = result.get('extracted')
+        self.last_checked = datetime.utcnow()
+        db.session.commit()
+        return self
+    
+    def save(self):
+        db.session.add(self) 
+        db.session.commit()
+        return self
+
+
+    
+
+
+
+class RevisitState(db.Model):
+    """
+    Tracks the change history of a crawled URL so the revisit scheduler can estimate how often it changes. Each
+    user crawling a URL has their own state, matching their own CrawledData row.
+
+    Attributes:
+        id (int): Unique identifier for the revisit state.
+        user_id (int): Foreign key to the Users table; revisits are enqueued on behalf of this user.
+        url (str): The tracked URL.
+        check_count (int): Number of times the URL has been fetched or revalidated.
+        change_count (int): Number of those checks where the content hash had changed.
+        first_checked (datetime): When the URL was first fetched.
+        last_checked (datetime): When the URL was last fetched or revalidated.
+        last_changed (datetime): When a change was last observed.
+        interval (float): Revisit interval in seconds derived from the estimated change rate.
+        next_visit (datetime): When the URL is next due to be enqueued.
+    """
+
+    __tablename__ = 'RevisitState'
+    __table_args__ = (db.UniqueConstraint('user_id', 'url'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('Users.id'), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    check_count = db.Column(db.Integer, nullable=False, default=0)
+    change_count = db.Column(db.Integer, nullable=False, default=0)
+    first_checked = db.Column(db.DateTime, nullable=False)
+    last_checked = db.Column(db.DateTime, nullable=False)
+    last_changed = db.Column(db.DateTime, nullable=True)
+    interval = db.Column(db.Float, nullable=False)
+    next_visit = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, user_id, url, interval, checked_at):
+        self.user_id = user_id
+        self.url = url
+        self.check_count = 0
+        self.change_count = 0
+        self.first_checked = checked_at
+        self.last_checked = checked_at
+        self.interval = interval
+        self.next_visit = checked_at
+
+    def __repr__(self):
+        return f"{self.id} - URL: {self.url} - every {self.interval:.0f}s"
+
+
+class ExtractionProfile(db.Model):
+    """
+    Declares the extra fields a user captures from the pages of one domain. Each user has at most one profile per
+    domain, applied only to the pages that user crawls. Rules are stored as JSON and compiled by
+    app.services.extraction when the first page of the domain is parsed.
+
+    Attributes:
+        id (int): Unique identifier for the profile.
+        user_id (int): Foreign key to the Users table; the user who owns the profile and whose crawls it applies to.
+        domain (str): The domain the profile applies to, without 'www.'.
+        rules (JSON): A list of rules such as {"name": "price", "type": "css", "expr": "span.price"}.
+        enabled (bool): Whether the profile is applied to crawled pages.
+        updated_at (datetime): When the rules were last changed; cached compiled profiles are rebuilt when it changes.
+    """
+
+    __tablename__ = 'ExtractionProfile'
+    __table_args__ = (db.UniqueConstraint('user_id', 'domain'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('Users.id'), nullable=False)
+    domain = db.Column(db.String(255), nullable=False)
+    rules = db.Column(db.JSON, nullable=False)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, user_id, domain, rules, enabled=True):
+        self.user_id = user_id
+        self.domain = domain
+        self.rules = rules
+        self.enabled = enabled
+        self.updated_at = datetime.utcnow()
+
+    def __repr__(self):
+        return f"{self.id} - Domain: {self.domain} - {len(self.rules)} rules"
+
+    def to_dict(self):
+        return {
+            'domain': self.domain,
+            'rules': self.rules,
+            'enabled': self.enabled,
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+def _unique_alone(conn, table_name, column_name):
+    """ Checks whether a SQLite table created by an older version has a unique index on one column alone. """
+    for index in conn.execute(text(f'PRAGMA index_list("{table_name}")')).mappings():
+        if index['unique']:
+            columns = [row['name'] for row in conn.execute(text(f'PRAGMA index_info("{index["name"]}")')).mappings()]
+            if columns == [column_name]:
+                return True
+    return False
+
+
+def upgrade_schema():
+    """
+    Brings tables created by older versions up to date without losing their rows, since db.create_all() only
+    creates missing tables. Must run inside an application context, after db.create_all(). Safe to run on every
+    start: it does nothing once the schema is current.
+
+    - CrawledData and RevisitState tables whose url is unique on its own, and ExtractionProfile tables whose domain
+      is, are rebuilt with that column unique per user, copying every row. SQLite cannot drop a constraint in place, so the table is renamed, created again and
+      filled from the old one in a single transaction.
+    - Nullable columns added to a model since its table was created are added with ALTER TABLE ... ADD COLUMN.
+
+    Returns:
+    list: A description of each change that was made.
+    """
+    changes = []
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            for table, column_name in ((CrawledData.__table__, 'url'), (RevisitState.__table__, 'url'),
+                                       (ExtractionProfile.__table__, 'domain')):
+                if not inspect(conn).has_table(table.name) or not _unique_alone(conn, table.name, column_name):
+                    continue
+                old_name = f'{table.name}_old'
+                old_columns = {column['name'] for column in inspect(conn).get_columns(table.name)}
+                conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"'))
+                table.create(conn)
+                columns = ', '.join(f'"{column.name}"' for column in table.columns if column.name in old_columns)
+                conn.execute(text(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"'))
+                conn.execute(text(f'DROP TABLE "{old_name}"'))
+                changes.append(f"rebuilt {table.name} with {column_name} unique per user")
+
+        for table in db.metadata.sorted_tables:
+            if not inspect(conn).has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                changes.append(f"added {table.name}.{column.name}")
+    return changes
+
+
+class Data(db.Model):
+    """
+    Represents generic data stored in the application. This class is a model that defines the structure of the 'Data' table in the database.
+
+    Attributes:
+        id (int): Unique identifier for the data entry.
+        version (str): Version of the data or related application component.
+        status (str): Status associated with the data.
+        error_code (int): Error code associated with the data, if applicable.
+    """
+
+    __tablename__ = 'Data'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(12), unique=True)
+    status = db.Column(db.String(7))
+    error_code = db.Column(db.Integer)
+
+    def __init__(self, version, status, error_code):
+        self.version = version
+        self.status = status
+        self.error_code = error_code
+    
+    def save(self):
+        db.session.add(self)
+        db.session.commit()
+
         return self
\ No newline at end of file
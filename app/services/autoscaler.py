@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+from collections import deque
+
+from ..utils.logger import logger, log_event
+
+
+class ProcessUsage:
+    """
+    A class sampling the CPU and memory usage of the current process.
+
+    CPU usage is measured from os.times() between two samples, as a fraction of one CPU core: the crawl pool is a
+    single process whose Python code holds the GIL, so one core is its real capacity. Resident memory is read
+    from psutil when it is installed, otherwise from /proc/self/statm, and as a last resort from the peak RSS
+    reported by the resource module.
+
+    Methods:
+    sample(): Returns the fraction of one core used since the previous sample and the current RSS in megabytes.
+    """
+
+    def __init__(self):
+        self._last_wall = time.monotonic()
+        self._last_cpu = self._cpu_seconds()
+
+    @staticmethod
+    def _cpu_seconds():
+        times = os.times()
+        return times.user + times.system
+
+    @staticmethod
+    def rss_mb():
+        """ Returns the resident memory of the process in megabytes, or None if it cannot be measured. """
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss / (1024 * 1024)
+        except ImportError:
+            pass
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        except (OSError, ValueError, IndexError, AttributeError):
+            pass
+        try:
+            import resource
+            # Peak rather than current RSS, reported in kilobytes on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except ImportError:
+            return None
+
+    def sample(self):
+        """
+        Samples the process.
+
+        Returns:
+        tuple: The fraction of one CPU core used since the previous sample, and the RSS in megabytes. Threads
+        running outside the GIL, e.g. in C extensions, can push it slightly above 1.
+        """
+        now, cpu = time.monotonic(), self._cpu_seconds()
+        elapsed = now - self._last_wall
+        usage = (cpu - self._last_cpu) / elapsed if elapsed > 0 else 0.0
+        self._last_wall, self._last_cpu = now, cpu
+        return usage, self.rss_mb()
+
+
+class PoolAutoscaler:
+    """
+    A class that resizes the crawl worker pool between min_workers and max_workers.
+
+    Every interval seconds it reads the queue backlog, the median task latency and error rate recorded by the
+    pool, and the CPU and memory usage of the process, and adjusts the pool with an AIMD controller:
+
+    - Multiplicative decrease: when the error rate or latency is above its limit (hosts timing out, refusing
+      connections or answering 5xx or 429) or the process is short of CPU or memory, the pool is halved, at most once
+      per cooldown period so the metrics window can fill with results from the smaller pool first.
+    - Additive increase: when the backlog is larger than the pool and everything is healthy, one worker is added.
+      The backlog only counts tasks that are ready to fetch: tasks parked until their host's politeness slot is due
+      are left out, since more workers would not crawl them any sooner.
+    - When the queue is empty, one worker is removed per tick down to min_workers.
+
+    Methods:
+    run_once(): Takes one scaling decision and applies it.
+    start(): Starts the autoscaler loop in a background thread.
+    status(): Returns the limits, the last measurements and recent scaling decisions.
+
+    Attributes:
+    pool (CrawlWorkerPool): The pool being resized.
+    min_workers (int): The smallest pool size.
+    max_workers (int): The largest pool size.
+    interval (float): Seconds between scaling decisions.
+    target_latency (float): Median task latency in seconds above which the pool is shrunk.
+    max_error_rate (float): Fraction of failed tasks above which the pool is shrunk.
+    max_cpu (float): Fraction of one CPU core above which the pool is shrunk.
+    max_rss_mb (float): Resident memory in megabytes above which the pool is shrunk.
+    cooldown (float): Minimum number of seconds between two decreases.
+    min_samples (int): Number of recorded tasks needed before latency and error rate are trusted.
+    decisions (deque): The most recent scaling decisions.
+    stop_event (threading.Event): Event that stops the background loop when set.
+    """
+
+    def __init__(self, pool, min_workers=1, max_workers=20, interval=5, target_latency=8.0, max_error_rate=0.3,
+                 max_cpu=0.9, max_rss_mb=1024, cooldown=30, min_samples=10, stop_event=None):
+        self.pool = pool
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.max_cpu = max_cpu
+        self.max_rss_mb = max_rss_mb
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.decisions = deque(maxlen=50)
+        self.stop_event = stop_event or threading.Event()
+        self.usage = ProcessUsage()
+        self.last_measurement = None
+        self.thread = None
+        self._last_decrease = 0.0
+
+    def pressure(self, measurement):
+        """
+        Returns the reason the pool should back off, or None if it is healthy.
+
+        Args:
+        measurement (dict): The backlog, pool metrics and process usage of the current tick.
+
+        Returns:
+        str: A short reason, or None.
+        """
+        if measurement['samples'] >= self.min_samples:
+            if measurement['error_rate'] > self.max_error_rate:
+                return f"error rate {measurement['error_rate']:.0%}"
+            if measurement['latency_p50'] is not None and measurement['latency_p50'] > self.target_latency:
+                return f"latency {measurement['latency_p50']:.1f}s"
+        if measurement['cpu'] > self.max_cpu:
+            return f"cpu {measurement['cpu']:.0%}"
+        if measurement['rss_mb'] is not None and measurement['rss_mb'] > self.max_rss_mb:
+            return f"rss {measurement['rss_mb']:.0f}MB"
+        return None
+
+    def decide(self, current, measurement):
+        """
+        Computes the next pool size.
+
+        Args:
+        current (int): The current target number of workers.
+        measurement (dict): The backlog, pool metrics and process usage of the current tick.
+
+        Returns:
+        tuple: The new number of workers and the reason for it.
+        """
+        reason = self.pressure(measurement)
+        if reason:
+            if time.monotonic() - self._last_decrease < self.cooldown:
+                return current, None
+            return max(self.min_workers, current // 2), reason
+        if measurement['backlog'] > current and current < self.max_workers:
+            return current + 1, f"backlog {measurement['backlog']}"
+        if measurement['backlog'] == 0 and current > self.min_workers:
+            return current - 1, 'queue empty'
+        return current, None
+
+    def run_once(self):
+        """
+        Measures the pool and the process and resizes the pool if needed. Does nothing unless the pool is running
+        or draining.
+
+        Returns:
+        int: The target number of workers after the decision.
+        """
+        current = self.pool.num_workers
+        cpu, rss_mb = self.usage.sample()
+        measurement = {
+            'backlog': self.pool.request_queue.size(),
+            'cpu': cpu,
+            'rss_mb': rss_mb,
+            **self.pool.metrics.snapshot(),
+        }
+        self.last_measurement = measurement
+        if self.pool.state not in ('running', 'draining'):
+            return current
+
+        # Keep the pool within limits even if it was started outside them
+        bounded = min(self.max_workers, max(self.min_workers, current))
+        target, reason = self.decide(bounded, measurement)
+        if target == bounded and bounded != current:
+            reason = 'limits'
+        if target == current:
+            return current
+
+        if target < current and reason not in ('queue empty', 'limits'):
+            self._last_decrease = time.monotonic()
+        self.pool.resize(target)
+        self.decisions.append({'time': time.time(), 'from': current, 'to': target, 'reason': reason, **measurement})
+        log_event('pool.resize', f"Resized crawl pool from {current} to {target} workers: {reason}",
+                  workers=target, previous=current, reason=reason)
+        return target
+
+    def start(self):
+        """
+        Starts the autoscaler loop in a daemon thread. Does nothing if the loop is already running.
+
+        Returns:
+        threading.Thread: The started thread.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return self.thread
+        self.stop_event.clear()
+
+        def loop():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Autoscaler error: {e}")
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def status(self):
+        """
+        Returns the autoscaler state for monitoring.
+
+        Returns:
+        dict: The worker limits, whether the loop is running, the last measurement and recent decisions, newest last.
+        """
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'min_workers': self.min_workers,
+            'max_workers': self.max_workers,
+            'last_measurement': self.last_measurement,
+            'decisions': list(self.decisions),
+        }
@@ -0,0 +1,166 @@
+import json
+import time
+
+
+class CrawlCheckpoint:
+    """
+    A class that persists crawler state in Redis so a restarted crawler can continue where it stopped.
+
+    The frontier itself already lives in the Redis request queue, and tasks taken by workers are tracked as in flight
+    by RequestQueue. This class stores the rest: the seen-set of URLs with the time they were last processed,
+    the per-host politeness schedule, and the pool state requested by the last pause, resume, drain or stop. The
+    state is shared by every crawler process, which poll it to follow controls issued through any of them. Each
+    crawler process also reports its status here, so a web process that does not crawl can monitor them all.
+
+    Methods:
+    mark_seen(url, timestamp, user_id): Records that a user's URL was processed at the given time.
+    seen_since(url, timestamp, user_id): Checks whether a user's URL was processed at or after the given time.
+    save_hosts(next_allowed): Stores the per-host politeness schedule.
+    load_hosts(): Loads the per-host politeness schedule.
+    save_state(state): Stores the requested pool state.
+    load_state(): Loads the requested pool state and when it was requested.
+    save_status(owner, status): Stores the status reported by a crawler process.
+    remove_status(owner): Removes the status of a crawler process that stopped.
+    load_statuses(max_age): Loads the recent status of every crawler process.
+
+    Attributes:
+    redis (StrictRedis): The Redis client used for storage, shared with the request queue.
+    prefix (str): The prefix of every Redis key written by the checkpoint.
+    seen_retention (int): Seconds after which seen-set entries are discarded.
+    """
+
+    def __init__(self, redis_client, prefix='crawler', seen_retention=7 * 86400):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.seen_retention = seen_retention
+        self.seen_key = f'{prefix}:seen'
+        self.hosts_key = f'{prefix}:hosts'
+        self.state_key = f'{prefix}:state'
+        self.status_key = f'{prefix}:status'
+
+    @staticmethod
+    def _seen_member(url, user_id):
+        # URLs are tracked per user, so one user's crawl never makes another user's task look done
+        return url if user_id is None else f'{user_id}|{url}'
+
+    def mark_seen(self, url, timestamp=None, user_id=None):
+        """
+        Records that a URL was processed.
+
+        Args:
+        url (str): The processed URL.
+        timestamp (float): When it was processed. Defaults to now.
+        user_id: The user the URL was processed for.
+
+        Returns:
+        None
+        """
+        self.redis.zadd(self.seen_key, {self._seen_member(url, user_id): timestamp or time.time()})
+
+    def seen_since(self, url, timestamp, user_id=None):
+        """
+        Checks whether a URL was processed at or after a given time, e.g. after the task for it was enqueued.
+
+        Args:
+        url (str): The URL to check.
+        timestamp (float): The reference time.
+        user_id: The user the URL is processed for.
+
+        Returns:
+        bool: True if the URL was processed for the user at or after the timestamp.
+        """
+        processed_at = self.redis.zscore(self.seen_key, self._seen_member(url, user_id))
+        return processed_at is not None and processed_at >= timestamp
+
+    def save_hosts(self, next_allowed):
+        """
+        Stores the per-host politeness schedule and trims expired seen-set entries.
+
+        Args:
+        next_allowed (dict): A mapping of host names to the earliest time the next request may be sent.
+
+        Returns:
+        None
+        """
+        pipe = self.redis.pipeline()
+        pipe.delete(self.hosts_key)
+        if next_allowed:
+            pipe.hset(self.hosts_key, mapping=next_allowed)
+        pipe.zremrangebyscore(self.seen_key, '-inf', time.time() - self.seen_retention)
+        pipe.execute()
+
+    def load_hosts(self):
+        """
+        Loads the per-host politeness schedule.
+
+        Returns:
+        dict: A mapping of host names to the earliest time the next request may be sent.
+        """
+        return {host.decode('utf-8'): float(ts) for host, ts in self.redis.hgetall(self.hosts_key).items()}
+
+    def save_state(self, state):
+        """
+        Stores the requested pool state together with the time it was saved.
+
+        Args:
+        state (str): The pool state, e.g. 'running' or 'paused'.
+
+        Returns:
+        float: The time the state was saved, which identifies the request.
+        """
+        saved_at = time.time()
+        self.redis.set(self.state_key, json.dumps({'state': state, 'saved_at': saved_at}))
+        return saved_at
+
+    def load_state(self):
+        """
+        Loads the requested pool state.
+
+        Returns:
+        tuple: The saved pool state and the time it was saved, or (None, 0.0) if nothing was saved.
+        """
+        saved = self.redis.get(self.state_key)
+        if not saved:
+            return None, 0.0
+        saved = json.loads(saved)
+        return saved['state'], saved['saved_at']
+
+    def save_status(self, owner, status):
+        """
+        Stores the status a crawler process reports for monitoring, with the time it was reported.
+
+        Args:
+        owner (str): The id of the crawler process.
+        status (dict): The JSON-serialisable status.
+
+        Returns:
+        None
+        """
+        self.redis.hset(self.status_key, owner, json.dumps({**status, 'saved_at': time.time()}, default=str))
+
+    def remove_status(self, owner):
+        """ Removes the status of a crawler process that stopped. """
+        self.redis.hdel(self.status_key, owner)
+
+    def load_statuses(self, max_age):
+        """
+        Loads the status of every crawler process. Statuses older than max_age seconds were left by processes that
+        died without removing theirs, and are dropped.
+
+        Args:
+        max_age (float): Seconds after which a status is considered stale.
+
+        Returns:
+        dict: The status of every live crawler process keyed by process id.
+        """
+        statuses, stale = {}, []
+        deadline = time.time() - max_age
+        for owner, saved in self.redis.hgetall(self.status_key).items():
+            status = json.loads(saved)
+            if status['saved_at'] < deadline:
+                stale.append(owner)
+            else:
+                statuses[owner.decode('utf-8')] = status
+        if stale:
+            self.redis.hdel(self.status_key, *stale)
+        return statuses
@@ -0,0 +1,336 @@
+import logging
+from datetime import datetime
+from threading import Event, RLock
+
+from flask import current_app
+
+from ..models import CrawledData, ExtractionProfile, db
+from ..utils.logger import logger, log_event
+
+# Redis hash counting the responses skipped by the response gate per reason, across all crawler processes
+SKIPPED_KEY = 'crawler:skipped'
+
+
+class CrawlServices:
+    """
+    A class holding the crawl services of one application: the request queue, response archive, sitemap discovery,
+    revisit scheduler, worker pool, pool autoscaler, live result feed, extraction profile cache and task profiler.
+
+    Each service is created the first time it is used, and the modules behind it (requests, BeautifulSoup, redis)
+    are imported at that point rather than when the application is imported. Nothing runs in the background until
+    start() is called, so the web process, CLI tools and tests can create the application without side effects.
+
+    Methods:
+    start(): Starts the worker pool and, if enabled, the revisit scheduler and the autoscaler.
+    stop(): Stops the worker pool, the revisit scheduler and the autoscaler.
+    process_crawl_task(task): Handles one crawl task taken from the request queue.
+    skip_stats(): Returns the number of responses skipped per reason by every crawler process.
+
+    Attributes:
+    app (Flask): The application the services belong to.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # Services are created on first use, possibly by several worker threads at once
+        self._lock = RLock()
+        self._request_queue = None
+        self._warc_archive = None
+        self._sitemap_discovery = None
+        self._revisit_scheduler = None
+        self._worker_pool = None
+        self._autoscaler = None
+        self._result_feed = None
+        self._extraction_profiles = None
+        self._profiler = None
+
+    @property
+    def config(self):
+        return self.app.config
+
+    @property
+    def request_queue(self):
+        with self._lock:
+            if self._request_queue is None:
+                from .queue_service import RequestQueue
+                self._request_queue = RequestQueue(
+                    host=self.config['REDIS_HOST'],
+                    port=self.config['REDIS_PORT'],
+                    db=self.config['REDIS_DB']
+                )
+        return self._request_queue
+
+    @property
+    def warc_archive(self):
+        # Raw responses are archived only when enabled, so reparse can rebuild CrawledData without refetching.
+        with self._lock:
+            if self._warc_archive is None and self.config['ARCHIVE_RESPONSES']:
+                from .warc_archive import WarcArchive
+                self._warc_archive = WarcArchive(self.config['WARC_DIR'], self.config['WARC_MAX_BYTES'])
+        return self._warc_archive
+
+    @property
+    def sitemap_discovery(self):
+        with self._lock:
+            if self._sitemap_discovery is None:
+                from .sitemap_discovery import SitemapDiscovery
+                self._sitemap_discovery = SitemapDiscovery(
+                    self.request_queue,
+                    max_urls=self.config['SITEMAP_MAX_URLS'],
+                    max_sitemaps=self.config['SITEMAP_MAX_FILES']
+                )
+        return self._sitemap_discovery
+
+    @property
+    def revisit_scheduler(self):
+        with self._lock:
+            if self._revisit_scheduler is None:
+                from .revisit_scheduler import RevisitScheduler
+                self._revisit_scheduler = RevisitScheduler(
+                    self.request_queue,
+                    budget_per_hour=self.config['REVISIT_BUDGET_PER_HOUR'],
+                    min_interval=self.config['REVISIT_MIN_INTERVAL'],
+                    max_interval=self.config['REVISIT_MAX_INTERVAL'],
+                    poll_interval=self.config['REVISIT_POLL_INTERVAL'],
+                    stop_event=Event()
+                )
+        return self._revisit_scheduler
+
+    @property
+    def worker_pool(self):
+        # Worker threads take tasks from the queue; their progress is checkpointed to Redis so a restart resumes the crawl
+        with self._lock:
+            if self._worker_pool is None:
+                from .checkpoint import CrawlCheckpoint
+                from .worker_pool import CrawlWorkerPool
+                self._worker_pool = CrawlWorkerPool(
+                    self.app,
+                    self.request_queue,
+                    self.process_crawl_task,
+                    CrawlCheckpoint(self.request_queue.redis),
+                    num_workers=self.config['CRAWL_WORKERS'],
+                    politeness_delay=self.config['CRAWL_DELAY']
+                )
+        return self._worker_pool
+
+    @property
+    def autoscaler(self):
+        # Resizes the worker pool between CRAWL_MIN_WORKERS and CRAWL_MAX_WORKERS from backlog, latency and errors
+        with self._lock:
+            if self._autoscaler is None:
+                from .autoscaler import PoolAutoscaler
+                self._autoscaler = PoolAutoscaler(
+                    self.worker_pool,
+                    min_workers=self.config['CRAWL_MIN_WORKERS'],
+                    max_workers=self.config['CRAWL_MAX_WORKERS'],
+                    interval=self.config['AUTOSCALE_INTERVAL'],
+                    target_latency=self.config['AUTOSCALE_TARGET_LATENCY'],
+                    max_error_rate=self.config['AUTOSCALE_MAX_ERROR_RATE'],
+                    max_cpu=self.config['AUTOSCALE_MAX_CPU'],
+                    max_rss_mb=self.config['AUTOSCALE_MAX_RSS_MB'],
+                    cooldown=self.config['AUTOSCALE_COOLDOWN']
+                )
+        return self._autoscaler
+
+    @property
+    def result_feed(self):
+        with self._lock:
+            if self._result_feed is None:
+                from .result_feed import ResultFeed
+                self._result_feed = ResultFeed(
+                    self.request_queue.redis,
+                    capacity=self.config['FEED_CAPACITY'],
+                    progress_interval=self.config['FEED_PROGRESS_INTERVAL']
+                )
+        return self._result_feed
+
+    @property
+    def extraction_profiles(self):
+        # Compiled per-user, per-domain extraction profiles, shared by all crawler threads; rule timings go to Redis
+        with self._lock:
+            if self._extraction_profiles is None:
+                from .extraction import ExtractionStats, ProfileCache
+                self._extraction_profiles = ProfileCache(
+                    self.load_extraction_profile,
+                    capacity=self.config['EXTRACTION_CACHE_SIZE'],
+                    ttl=self.config['EXTRACTION_CACHE_TTL'],
+                    stats=ExtractionStats(self.request_queue.redis)
+                )
+        return self._extraction_profiles
+
+    @property
+    def profiler(self):
+        # Samples the stacks of a fraction of crawl tasks while enabled; created the first time it is enabled or queried
+        with self._lock:
+            if self._profiler is None:
+                from .profiler import CrawlProfiler
+                self._profiler = CrawlProfiler(
+                    self.config['PROFILE_DIR'],
+                    sample_rate=self.config['PROFILE_SAMPLE_RATE'],
+                    interval=self.config['PROFILE_INTERVAL'],
+                    flush_interval=self.config['PROFILE_FLUSH_INTERVAL'],
+                    redis_client=self.request_queue.redis
+                )
+        return self._profiler
+
+    @staticmethod
+    def load_extraction_profile(user_id, domain):
+        """ Returns the version and rules of a user's enabled extraction profile for a domain, or None. """
+        profile = ExtractionProfile.query.filter_by(user_id=user_id, domain=domain, enabled=True).first()
+        return (profile.updated_at, profile.rules) if profile else None
+
+    def publish_result(self, user_id, url, status, **data):
+        """ Publishes the outcome of a crawl task to the user's live feed, without letting feed errors fail the task. """
+        try:
+            self.result_feed.publish(user_id, 'result', {'url': url, 'status': status, **data})
+        except Exception as e:
+            logger.error(f"Failed to publish result for {url}: {e}")
+
+    def skip_stats(self):
+        """ Returns the number of responses skipped per reason by every crawler process. """
+        return {reason.decode('utf-8'): int(count)
+                for reason, count in self.request_queue.redis.hgetall(SKIPPED_KEY).items()}
+
+    def start(self):
+        """
+        Starts the worker pool and, if enabled, the revisit scheduler that feeds it and the autoscaler that sizes
+        it. The task profiler starts enabled if PROFILE_ENABLED is set, and then follows the setting published
+        through POST /crawler/profiler, which takes precedence once one was published.
+
+        Returns:
+        int: The number of in-flight tasks from a previous run that were returned to the queue.
+        """
+        if self.config['PROFILE_ENABLED']:
+            self.profiler.enable()
+        self.profiler.follow()
+        requeued = self.worker_pool.start()
+        if self.config['REVISIT_ENABLED']:
+            self.revisit_scheduler.start(self.app)
+        if self.config['AUTOSCALE_ENABLED']:
+            self.autoscaler.start()
+            self.worker_pool.reporters['autoscaler'] = self.autoscaler.status
+        return requeued
+
+    def stop(self):
+        """ Stops the worker pool after the current tasks, the revisit scheduler, the autoscaler and the profiler. """
+        if self._autoscaler is not None:
+            self._autoscaler.stop_event.set()
+        if self._worker_pool is not None:
+            self._worker_pool.stop()
+        if self._revisit_scheduler is not None:
+            self._revisit_scheduler.stop_event.set()
+        if self._profiler is not None:
+            self._profiler.unfollow()
+            self._profiler.disable()
+
+    def process_crawl_task(self, task):
+        """
+        Handles a single crawl task taken from the request queue by the worker pool.
+
+        Crawls the task's URL and stores the result in the database, revalidating URLs that were
+        already crawled instead of inserting them again. While the profiler is enabled, a sample of tasks
+        is profiled.
+
+        Args:
+        task (dict): The decoded task with 'user_id' and 'url'.
+
+        Returns:
+        str: The outcome, one of 'not_modified', 'failed', 'rejected', 'error', 'skipped', 'updated' or 'saved'.
+        Only 'failed' tasks, whose host timed out, refused the connection or answered 5xx or 429, count towards the
+        error rate the autoscaler reacts to. URLs that are invalid or answered with another error status are
+        'rejected', and tasks that raised while being stored are 'error'.
+        """
+        profiler = self._profiler
+        if profiler is not None and profiler.begin(task['url']):
+            try:
+                return self._crawl_and_store(task, profiler)
+            finally:
+                profiler.end()
+        return self._crawl_and_store(task)
+
+    def _crawl_and_store(self, task, profiler=None):
+        """ Crawls a task's URL and stores the result, reporting each stage to the profiler of a profiled task. """
+        from .crawler import WebCrawler
+
+        log_event('crawl.start', f"Processing URL {task['url']} for user {task['user_id']}", url=task['url'], user_id=task['user_id'])
+        user_id = task['user_id']
+        url = task['url']
+        web_crawler = WebCrawler(
+            url=url,
+            archive=self.warc_archive,
+            max_html_bytes=self.config['CRAWL_MAX_HTML_BYTES'],
+            max_media_bytes=self.config['CRAWL_MAX_MEDIA_BYTES'],
+            html_types=self.config['CRAWL_HTML_TYPES'],
+            media_types=self.config['CRAWL_MEDIA_TYPES'],
+            extraction_profiles=self.extraction_profiles,
+            user_id=user_id,
+            profiler=profiler
+        )
+        try:
+            # Already-crawled URLs are revalidated instead of re-fetched and re-parsed
+            existing = CrawledData.query.filter_by(user_id=user_id, url=url).first()
+            validators = existing.validators() if existing else None
+            result = web_crawler.crawl(url, validators=validators)
+            if profiler is not None:
+                profiler.set_stage('store')
+            if result and result.get('not_modified') and existing:
+                existing.etag = result['etag']
+                existing.last_modified = result['last_modified']
+                existing.last_checked = datetime.utcnow()
+                db.session.commit()
+                self.revisit_scheduler.record_check(url, existing.user_id, changed=False)
+                log_event('crawl.not_modified', f"{url} not modified since last crawl", url=url)
+                self.publish_result(user_id, url, 'not_modified')
+                return 'not_modified'
+            elif result and 'error' in result:
+                log_event('crawl.failed', f"Failed to crawl {url}: {result['error']}", logging.WARNING, url=url, error=result['error'])
+                self.publish_result(user_id, url, 'failed', error=result['error'])
+                return 'failed' if result.get('transient') else 'rejected'
+            elif result and 'skipped' in result:
+                self.request_queue.redis.hincrby(SKIPPED_KEY, result['skipped'], 1)
+                self.publish_result(user_id, url, 'skipped', reason=result['skipped'], detail=result.get('detail'))
+                return 'skipped'
+            elif result and existing:
+                existing.update_from(result)
+                self.revisit_scheduler.record_check(url, existing.user_id, changed=True)
+                log_event('crawl.updated', f"{url} changed, updated in place", url=url)
+                self.publish_result(user_id, url, 'updated', title=result['title'], content_type=result['content-type'])
+                return 'updated'
+            elif result:
+                # Create an instance of CrawledData and populate its fields
+                crawled_data = CrawledData(
+                    user_id=user_id,
+                    url=result['url'],
+                    title=result['title'],
+                    content=result['content'],
+                    file_path=result['file_path'] if result['file_path'] else '',
+                    content_type=result['content-type'],
+                    links=','.join(result['links']) if result['links'] else '',  # Assuming the links column is a comma-separated string of links
+                    etag=result.get('etag'),
+                    last_modified=result.get('last_modified'),
+                    content_hash=result.get('content_hash'),
+                    extracted=result.get('extracted')
+                )
+                crawled_data.save()
+                log_event('crawl.saved', f"Saved {url} for user {user_id}", url=url, user_id=user_id)
+                self.revisit_scheduler.record_check(crawled_data.url, crawled_data.user_id, changed=False)
+                # flash("URL has been scraped", 'success')
+                self.publish_result(user_id, url, 'saved', title=result['title'], content_type=result['content-type'])
+                return 'saved'
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"An error occured while crawling {url}: {e}")
+            return 'error'
+
+
+def get_services(app=None):
+    """
+    Returns the crawl services of an application.
+
+    Args:
+    app (Flask): The application. Defaults to the current application.
+
+    Returns:
+    CrawlServices: The services registered by create_app().
+    """
+    return (app or current_app).extensions['crawl_services']
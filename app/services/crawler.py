@@ -1,124 +1,303 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor
-from ..utils import robots_parser, url_utils
-from ..utils.logger import logger
-import os
-import threading
-# from flask import flash
-
-#media Dir
-MEDIA_DIR = 'downloaded_media'
-if not os.path.exists(MEDIA_DIR):
-    os.makedirs(MEDIA_DIR)
-
-class WebCrawler:
-    """
-    A class to perform web crawling tasks. It fetches web pages, parses their content, and extracts useful information such as links and media.
-
-    Methods:
-    crawl(url): Performs the crawling operation for a given URL.
-
-    Attributes:
-    url (str): The initial URL to start crawling from.
-    max_depth (int): The maximum depth of crawling.
-    max_pages (int): The maximum number of pages to crawl.
-    delay (int): The delay between requests to respect the website's robots.txt rules.
-    crawled_pages (set): A set of already crawled URLs to avoid duplication.
-    executor (ThreadPoolExecutor): An executor for managing concurrent crawling tasks.
-    lock (threading.Lock): A lock to control access to shared resources in a multithreaded environment.
-    """
-
-    def __init__(self, url, max_depth=5, max_pages=100, delay=2):
-        self.url = url
-        self.max_depth = max_depth
-        self.max_pages = max_pages
-        self.delay = delay
-        self.crawled_pages = set()
-        self.executor = ThreadPoolExecutor(max_workers=10)
-        self.lock = threading.Lock()
-
-    def extract_text(self, soup, tag, class_name=None):
-        """ Extracts text from a specific tag and class name (optional). """
-        elements = soup.find_all(tag, class_=class_name) if class_name else soup.find_all(tag)
-        return ' '.join([elem.get_text(strip=True) for elem in elements])
-
-    def crawl(self, url):
-        """
-        Performs the crawling operation for a given URL. This method fetches the page, checks for robots.txt compliance,
-        and extracts and returns relevant data like title, content, links, etc.
-
-        Args:
-        url (str): The URL to crawl.
-
-        Returns:
-        A dictionary containing the crawled data, such as the URL, title, content, content type, file path for downloaded media, and extracted links.
-        If an error occurs or the URL is invalid, an appropriate error message is returned.
-        """
-        # Validate URL
-        if not url_utils.is_valid_url(url):
-            # flash("Please enter a valid url", 'warning')
-            logger.warning(f"url {url}, error Invalid URL")
-            return {'url': url, 'error': 'Invalid URL'}
-        
-        with self.lock:
-            if url in self.crawled_pages:
-                return
-            else:
-                self.crawled_pages.add(url)
-        file_name = None
-        domain = urlparse(url).netloc
-        robot_parser = robots_parser.RobotsParser(url)
-        can_fetch = robot_parser.can_fetch(url)
-        if can_fetch is None:  # Assuming can_fetch returns None if robots.txt is not found
-            print(f"No robots.txt found for {url}, proceeding with crawling.")
-        elif not can_fetch:
-            # flash(f"Cannot fetch {url} due to site restrictions")
-            print(f"Cannot fetch {url} due to robots.txt restriction.")
-            logger.warning(f"Cannot fetch {url} due to robots.txt restriction.")
-            return None
-        
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-
-            content_type = response.headers.get('Content-Type')
-            print(content_type)
-            # If the content type indicates an image or application/file
-            if 'image' in content_type or 'application' in content_type:
-                file_name = os.path.join(MEDIA_DIR, url.split('/')[-1])
-                with open(file_name, 'wb') as file:
-                    file.write(response.content)
-
-
-            if response.status_code != 200:
-                logger.warning(f"Failed to fetch {url} - Status Code: {response.status_code}")
-                logger.info(f'Failed to fetch {url}')
-                # flash(f"Failed to fetch {url}")
-                return {'url': url, 'error': f"HTTP Error {response.status_code}"}
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-            title = soup.title.string.strip() if soup.title else "No title"
-            
-            # Store the content and links in the database
-            headers = self.extract_text(soup, 'h1') + ' ' + self.extract_text(soup, 'h2')
-            paragraphs = self.extract_text(soup, 'p')
-            content = headers + ' ' + paragraphs
-            # content = response.text
-            links = [link.get('href') for link in soup.find_all('a') if link.get('href')]
-            internal_links = [urljoin(url, link) for link in links if url_utils.is_internal(link, domain) and link not in self.crawled_pages]
-            image_links = [img.get('src') for img in soup.find_all('img') if img.get('src')]
-            all_links = links + image_links + internal_links
-            return {
-                'url': url,
-                'title': title, 
-                'content': content,
-                'content-type': content_type,
-                'file_path': file_name,
-                'links': all_links
-            }
-
-        except requests.RequestException as e:
-            logger.error(f"Error while fetching {url}: {str(e)}")
-            return {'url': url, 'error': str(e)}
\ No newline at end of file
+import requests
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from ..utils import robots_parser, url_utils
+from ..utils.logger import logger, log_event
+import hashlib
+import logging
+import os
+import threading
+# from flask import flash
+
+#media Dir
+MEDIA_DIR = 'downloaded_media'
+if not os.path.exists(MEDIA_DIR):
+    os.makedirs(MEDIA_DIR)
+
+# Content types parsed as pages, and prefixes of content types downloaded as media files
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+MEDIA_CONTENT_TYPES = ('image/', 'application/')
+CHUNK_SIZE = 64 * 1024
+
+
+def record_skip(url, reason, detail=None):
+    """
+    Logs a response that was not downloaded, returning the result dictionary for it. The reason is one of a fixed
+    set of strings, so it can be counted; server-supplied values such as the content type go in the detail.
+    """
+    log_event('crawl.skipped', f"Skipped {url}: {reason}" + (f" ({detail})" if detail else ''),
+              url=url, reason=reason, detail=detail)
+    return {'url': url, 'skipped': reason, 'detail': detail}
+
+
+def is_transient_error(error):
+    """
+    Returns whether a failed request points at a struggling host rather than at the URL: a timeout, a connection
+    error, a 5xx response or a 429. Only these count towards the error rate the worker pool is scaled down on.
+    """
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+class WebCrawler:
+    """
+    A class to perform web crawling tasks. It fetches web pages, parses their content, and extracts useful information such as links and media.
+
+    Methods:
+    crawl(url): Performs the crawling operation for a given URL.
+    parse(url, body, content_type, file_name): Extracts the title, content and links from a fetched page body.
+
+    Attributes:
+    url (str): The initial URL to start crawling from.
+    max_depth (int): The maximum depth of crawling.
+    max_pages (int): The maximum number of pages to crawl.
+    delay (int): The delay between requests to respect the website's robots.txt rules.
+    crawled_pages (set): A set of already crawled URLs to avoid duplication.
+    archive (WarcArchive): Optional archive that raw responses are written to so they can be re-parsed later.
+    max_html_bytes (int): Byte budget for HTML bodies; reading stops there and the page is parsed truncated.
+    max_media_bytes (int): Byte limit for media downloads; larger files are skipped.
+    html_types (tuple): Content types parsed as HTML pages.
+    media_types (tuple): Content type prefixes downloaded as media files.
+    extraction_profiles (ProfileCache): Optional cache of per-domain extraction profiles applied while parsing.
+    user_id: The user the crawl is for, whose extraction profiles are applied.
+    profiler (CrawlProfiler): Optional profiler told which stage a crawl has reached.
+    executor (ThreadPoolExecutor): An executor for managing concurrent crawling tasks.
+    lock (threading.Lock): A lock to control access to shared resources in a multithreaded environment.
+    """
+
+    def __init__(self, url, max_depth=5, max_pages=100, delay=2, archive=None, max_html_bytes=2 * 1024 * 1024,
+                 max_media_bytes=50 * 1024 * 1024, html_types=HTML_CONTENT_TYPES, media_types=MEDIA_CONTENT_TYPES,
+                 extraction_profiles=None, user_id=None, profiler=None):
+        self.url = url
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.delay = delay
+        self.crawled_pages = set()
+        self.archive = archive
+        self.max_html_bytes = max_html_bytes
+        self.max_media_bytes = max_media_bytes
+        self.html_types = tuple(html_types)
+        self.media_types = tuple(media_types)
+        self.extraction_profiles = extraction_profiles
+        self.user_id = user_id
+        self.profiler = profiler
+        self.executor = ThreadPoolExecutor(max_workers=10)
+        self.lock = threading.Lock()
+
+    def extract_text(self, soup, tag, class_name=None):
+        """ Extracts text from a specific tag and class name (optional). """
+        elements = soup.find_all(tag, class_=class_name) if class_name else soup.find_all(tag)
+        return ' '.join([elem.get_text(strip=True) for elem in elements])
+
+    def read_limited(self, response, limit):
+        """
+        Reads a streamed response body up to a byte limit.
+
+        Args:
+        response (requests.Response): A response opened with stream=True.
+        limit (int): The maximum number of bytes to read.
+
+        Returns:
+        A tuple (body, truncated) where truncated is True if the body was cut at the limit.
+        """
+        chunks, size = [], 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= limit:
+                return b''.join(chunks)[:limit], True
+        return b''.join(chunks), False
+
+    def download_media(self, response, file_name):
+        """
+        Streams a media response to disk, stopping if it grows past max_media_bytes.
+
+        Args:
+        response (requests.Response): A response opened with stream=True.
+        file_name (str): The path to write the file to.
+
+        Returns:
+        str: The SHA-256 of the file, or None if the download exceeded the limit and was discarded.
+        """
+        digest, size = hashlib.sha256(), 0
+        with open(file_name, 'wb') as file:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > self.max_media_bytes:
+                    break
+                digest.update(chunk)
+                file.write(chunk)
+        if size > self.max_media_bytes:
+            os.remove(file_name)
+            return None
+        return digest.hexdigest()
+
+    def parse(self, url, body, content_type=None, file_name=None, user_profiles=None):
+        """
+        Extracts the title, content and links from a fetched page body. Kept separate from crawl() so archived
+        responses can be re-parsed without fetching them again. If the crawl's user has an extraction profile for
+        the page's domain, its rules are applied to the same parsed tree.
+
+        Args:
+        url (str): The URL the body was fetched from, used to resolve relative links.
+        body (bytes): The raw response body.
+        content_type (str): The Content-Type header of the response.
+        file_name (str): The path the body was saved to, if it was downloaded as media.
+        user_profiles (dict): Compiled profiles keyed by user id, all applied to the same parsed tree when one page
+        is re-parsed for several users.
+
+        Returns:
+        A dictionary containing the URL, title, content, content type, file path, extracted links and the fields
+        captured by the extraction profile (None without a profile). With user_profiles, the fields captured for
+        each user are added under 'extracted_by_user'.
+        """
+        domain = urlparse(url).netloc
+        soup = BeautifulSoup(body, 'html.parser')
+        title = soup.title.string.strip() if soup.title and soup.title.string else "No title"
+
+        # Store the content and links in the database
+        headers = self.extract_text(soup, 'h1') + ' ' + self.extract_text(soup, 'h2')
+        paragraphs = self.extract_text(soup, 'p')
+        content = headers + ' ' + paragraphs
+        links = [link.get('href') for link in soup.find_all('a') if link.get('href')]
+        internal_links = [urljoin(url, link) for link in links if url_utils.is_internal(link, domain) and link not in self.crawled_pages]
+        image_links = [img.get('src') for img in soup.find_all('img') if img.get('src')]
+        all_links = links + image_links + internal_links
+
+        extracted = None
+        if self.extraction_profiles is not None:
+            profile = self.extraction_profiles.get(self.user_id, domain)
+            if profile is not None:
+                extracted = profile.extract(soup, body, self.extraction_profiles.stats)
+        result = {
+            'url': url,
+            'title': title,
+            'content': content,
+            'content-type': content_type,
+            'file_path': file_name,
+            'links': all_links,
+            'extracted': extracted
+        }
+        if user_profiles:
+            result['extracted_by_user'] = {user_id: profile.extract(soup, body)
+                                           for user_id, profile in user_profiles.items()}
+        return result
+
+    def crawl(self, url, validators=None):
+        """
+        Performs the crawling operation for a given URL. This method fetches the page, checks for robots.txt compliance,
+        and extracts and returns relevant data like title, content, links, etc.
+
+        When validators from a previous crawl are given, the request is made conditional with If-None-Match and
+        If-Modified-Since. A 304 response, or a body whose hash matches the stored one, is reported as not modified
+        without parsing the page.
+
+        Args:
+        url (str): The URL to crawl.
+        validators (dict): Optional 'etag', 'last_modified' and 'content_hash' from the previous crawl of the URL.
+
+        Returns:
+        A dictionary containing the crawled data, such as the URL, title, content, content type, file path for downloaded media, extracted links
+        and cache validators. Unchanged pages return {'url': url, 'not_modified': True, ...} instead.
+        If an error occurs or the URL is invalid, an appropriate error message is returned, with 'transient' set
+        for timeouts, connection errors, 5xx and 429 responses.
+        """
+        # Validate URL
+        if not url_utils.is_valid_url(url):
+            # flash("Please enter a valid url", 'warning')
+            logger.warning(f"url {url}, error Invalid URL")
+            return {'url': url, 'error': 'Invalid URL', 'transient': False}
+        
+        with self.lock:
+            if url in self.crawled_pages:
+                return
+            else:
+                self.crawled_pages.add(url)
+        file_name = None
+        if self.profiler is not None:
+            self.profiler.set_stage('robots')
+        robot_parser = robots_parser.RobotsParser(url)
+        can_fetch = robot_parser.can_fetch(url)
+        if can_fetch is None:  # Assuming can_fetch returns None if robots.txt is not found
+            log_event('crawl.robots_missing', f"No robots.txt found for {url}, proceeding with crawling.", url=url)
+        elif not can_fetch:
+            # flash(f"Cannot fetch {url} due to site restrictions")
+            log_event('crawl.robots_denied', f"Cannot fetch {url} due to robots.txt restriction.", logging.WARNING, url=url)
+            return None
+        
+        try:
+            validators = validators or {}
+            request_headers = {}
+            if validators.get('etag'):
+                request_headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                request_headers['If-Modified-Since'] = validators['last_modified']
+
+            if self.profiler is not None:
+                self.profiler.set_stage('fetch')
+            # Stream the response so the status and headers can be checked before any of the body is transferred
+            with requests.get(url, headers=request_headers, timeout=10, stream=True) as response:
+                response.raise_for_status()
+
+                etag = response.headers.get('ETag') or validators.get('etag')
+                last_modified = response.headers.get('Last-Modified') or validators.get('last_modified')
+                if response.status_code == 304:
+                    return {'url': url, 'not_modified': True, 'etag': etag, 'last_modified': last_modified}
+
+                if response.status_code != 200:
+                    logger.warning(f"Failed to fetch {url} - Status Code: {response.status_code}")
+                    logger.info(f'Failed to fetch {url}')
+                    # flash(f"Failed to fetch {url}")
+                    return {'url': url, 'error': f"HTTP Error {response.status_code}", 'transient': False}
+
+                content_type = response.headers.get('Content-Type') or ''
+                mime_type = content_type.split(';')[0].strip().lower()
+                content_length = response.headers.get('Content-Length')
+                content_length = int(content_length) if content_length and content_length.isdigit() else None
+
+                # A missing Content-Type is treated as HTML, which is what servers omitting it almost always send
+                if not mime_type or mime_type in self.html_types:
+                    body, truncated = self.read_limited(response, self.max_html_bytes)
+                    if truncated:
+                        logger.info(f"Truncated {url} at {self.max_html_bytes} bytes")
+                    content_hash = hashlib.sha256(body).hexdigest()
+                elif mime_type.startswith(self.media_types):
+                    if content_length is not None and content_length > self.max_media_bytes:
+                        return record_skip(url, 'media too large')
+                    file_name = os.path.join(MEDIA_DIR, url.split('/')[-1])
+                    content_hash = self.download_media(response, file_name)
+                    if content_hash is None:
+                        return record_skip(url, 'media too large')
+                    body = None
+                else:
+                    return record_skip(url, 'content type not allowed', mime_type)
+
+                if content_hash == validators.get('content_hash'):
+                    return {'url': url, 'not_modified': True, 'etag': etag, 'last_modified': last_modified}
+
+                if body is None:
+                    # Media is stored on disk rather than parsed
+                    result = {
+                        'url': url,
+                        'title': os.path.basename(file_name) or "No title",
+                        'content': '',
+                        'content-type': content_type,
+                        'file_path': file_name,
+                        'links': [],
+                        'extracted': None
+                    }
+                else:
+                    if self.archive is not None:
+                        self.archive.write_response(url, response, body)
+                    if self.profiler is not None:
+                        self.profiler.set_stage('parse')
+                    result = self.parse(url, body, content_type, file_name)
+                result.update({'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash})
+                return result
+
+        except requests.RequestException as e:
+            logger.error(f"Error while fetching {url}: {str(e)}")
+            return {'url': url, 'error': str(e), 'transient': is_transient_error(e)}
\ No newline at end of file
@@ -0,0 +1,388 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import soupsieve
+
+from ..utils.logger import logger
+
+# Rule types an extraction profile can use
+RULE_TYPES = ('css', 'xpath', 'meta', 'jsonld')
+
+
+class ExtractionRule:
+    """
+    A single compiled extraction rule of a profile.
+
+    Rules are given as dictionaries such as {'name': 'price', 'type': 'css', 'expr': 'span.price'}:
+
+    - css: 'expr' is a CSS selector, compiled with soupsieve and matched against the page's BeautifulSoup tree.
+    - xpath: 'expr' is an XPath expression, compiled with lxml.
+    - meta: 'expr' is the name or property of a <meta> tag, e.g. 'og:title'; its content is captured.
+    - jsonld: 'expr' is a dotted path into the page's JSON-LD objects, e.g. 'offers.price'. An optional
+      'schema_type' restricts the rule to objects of that @type, e.g. 'Product'.
+
+    CSS and XPath rules capture the element text, or the attribute named by 'attr'. With 'all' set, every match is
+    captured as a list; otherwise only the first match is.
+
+    Methods:
+    apply(page): Returns the value the rule captures from a parsed page.
+
+    Attributes:
+    name (str): The field name the value is stored under.
+    kind (str): One of RULE_TYPES.
+    expr (str): The selector, expression, meta name or JSON-LD path.
+    attr (str): The attribute to capture instead of the element text.
+    many (bool): Whether all matches are captured.
+    schema_type (str): The JSON-LD @type the rule is restricted to.
+    """
+
+    def __init__(self, name, kind, expr, attr=None, many=False, schema_type=None):
+        if not name:
+            raise ValueError("Every extraction rule needs a name")
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Rule '{name}' has unknown type '{kind}', expected one of {', '.join(RULE_TYPES)}")
+        if not expr:
+            raise ValueError(f"Rule '{name}' has no expression")
+        self.name = name
+        self.kind = kind
+        self.expr = expr
+        self.attr = attr
+        self.many = many
+        self.schema_type = schema_type
+        self._compiled = None
+        try:
+            if kind == 'css':
+                self._compiled = soupsieve.compile(expr)
+            elif kind == 'xpath':
+                from lxml import etree
+                self._compiled = etree.XPath(expr)
+            elif kind == 'jsonld':
+                self._compiled = expr.split('.')
+        except Exception as e:
+            raise ValueError(f"Rule '{name}' has an invalid {kind} expression: {e}")
+
+    @classmethod
+    def from_dict(cls, rule):
+        """ Builds a rule from its stored dictionary form. """
+        if not isinstance(rule, dict):
+            raise ValueError("Extraction rules must be objects")
+        return cls(rule.get('name'), rule.get('type'), rule.get('expr'), attr=rule.get('attr'),
+                   many=bool(rule.get('all')), schema_type=rule.get('schema_type'))
+
+    def _pick(self, values):
+        values = [value for value in values if value not in (None, '')]
+        if self.many:
+            return values
+        return values[0] if values else None
+
+    def apply(self, page):
+        """
+        Captures the rule's value from a parsed page.
+
+        Args:
+        page (ParsedPage): The page being extracted.
+
+        Returns:
+        A string, a JSON-LD value, or a list of them when the rule captures all matches. None if nothing matched.
+        """
+        if self.kind == 'css':
+            elements = self._compiled.select(page.soup, limit=0 if self.many else 1)
+            return self._pick(elem.get(self.attr) if self.attr else elem.get_text(strip=True) for elem in elements)
+        if self.kind == 'xpath':
+            matches = self._compiled(page.tree) if page.tree is not None else []
+            if not isinstance(matches, list):
+                # Expressions such as count() or string() return a single value
+                return matches
+            return self._pick(
+                str(match) if not hasattr(match, 'tag')
+                else match.get(self.attr) if self.attr else match.text_content().strip()
+                for match in matches
+            )
+        if self.kind == 'meta':
+            return self._pick(page.meta.get(self.expr.lower(), []))
+        return self._pick(self._resolve(obj) for obj in page.jsonld
+                          if not self.schema_type or self.schema_type in _types_of(obj))
+
+    def _resolve(self, obj):
+        """ Follows the dotted path through a JSON-LD object, taking the first item of any list on the way. """
+        for key in self._compiled:
+            if isinstance(obj, list):
+                obj = obj[0] if obj else None
+            if not isinstance(obj, dict):
+                return None
+            obj = obj.get(key)
+        return obj
+
+
+def normalize_domain(domain):
+    """ Reduces a host name or URL to the lower-case domain profiles are stored under, without port or 'www.'. """
+    if '://' in domain:
+        domain = urlparse(domain).netloc
+    domain = domain.strip().lower().split(':')[0]
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+def _types_of(obj):
+    """ Returns the @type values of a JSON-LD object as a list. """
+    types = obj.get('@type', [])
+    return types if isinstance(types, list) else [types]
+
+
+class ParsedPage:
+    """
+    A page as seen by extraction rules. The BeautifulSoup tree is the one the crawler already built; the lxml tree,
+    meta tags and JSON-LD objects are only built the first time a rule needs them.
+
+    Attributes:
+    soup (BeautifulSoup): The parsed page.
+    body (bytes): The raw body, parsed again by lxml only if the profile has XPath rules.
+    """
+
+    def __init__(self, soup, body):
+        self.soup = soup
+        self.body = body
+        self._tree = None
+        self._meta = None
+        self._jsonld = None
+
+    @property
+    def tree(self):
+        if self._tree is None and self.body:
+            import lxml.html
+            try:
+                self._tree = lxml.html.fromstring(self.body)
+            except Exception:
+                pass
+        return self._tree
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            self._meta = {}
+            for tag in self.soup.find_all('meta'):
+                key = tag.get('property') or tag.get('name') or tag.get('itemprop')
+                if key and tag.get('content') is not None:
+                    self._meta.setdefault(key.lower(), []).append(tag['content'])
+        return self._meta
+
+    @property
+    def jsonld(self):
+        if self._jsonld is None:
+            self._jsonld = []
+            for script in self.soup.find_all('script', type='application/ld+json'):
+                try:
+                    data = json.loads(script.string or '')
+                except ValueError:
+                    continue
+                for obj in data if isinstance(data, list) else [data]:
+                    if isinstance(obj, dict):
+                        self._jsonld.append(obj)
+                        self._jsonld.extend(item for item in obj.get('@graph', []) if isinstance(item, dict))
+        return self._jsonld
+
+
+class CompiledProfile:
+    """
+    The compiled rules of one user's extraction profile for a domain.
+
+    Methods:
+    extract(soup, body, stats): Applies every rule to a parsed page and returns the captured fields.
+
+    Attributes:
+    domain (str): The domain the profile applies to.
+    version (object): The version of the stored profile the rules were compiled from.
+    user_id (int): The user owning the profile, whose rule statistics the timings are recorded under.
+    rules (list): The compiled ExtractionRule objects.
+    """
+
+    def __init__(self, domain, rules, version=None, user_id=None):
+        self.domain = domain
+        self.version = version
+        self.user_id = user_id
+        self.rules = [ExtractionRule.from_dict(rule) for rule in rules]
+
+    def extract(self, soup, body, stats=None):
+        """
+        Applies every rule to a page. A rule that raises is recorded as an error and captures None, so one
+        broken rule does not lose the other fields.
+
+        Args:
+        soup (BeautifulSoup): The page as parsed by the crawler.
+        body (bytes): The raw page body.
+        stats (ExtractionStats): Where the time spent in each rule is recorded.
+
+        Returns:
+        dict: The captured values keyed by rule name.
+        """
+        page = ParsedPage(soup, body)
+        fields, timings = {}, []
+        for rule in self.rules:
+            started = time.perf_counter()
+            try:
+                fields[rule.name] = rule.apply(page)
+                failed = False
+            except Exception:
+                fields[rule.name] = None
+                failed = True
+            timings.append((rule.name, time.perf_counter() - started, failed))
+        if stats is not None:
+            stats.record(self.user_id, self.domain, timings)
+        return fields
+
+
+class ExtractionStats:
+    """
+    A class accumulating the time spent in each extraction rule, so expensive selectors can be found.
+
+    The statistics are kept in a Redis hash per user, so the rules applied by every crawler process are counted
+    together and any web process reports the same figures. Each field holds one figure of one rule, named
+    '<domain>|<rule>|<figure>', and is updated with HINCRBY and HINCRBYFLOAT.
+
+    Methods:
+    record(user_id, domain, timings): Adds the rule timings of one page.
+    snapshot(user_id): Returns the statistics of every rule of a user, slowest first.
+
+    Attributes:
+    redis (StrictRedis): The Redis client, shared with the request queue.
+    prefix (str): The prefix of the per-user Redis keys.
+    """
+
+    def __init__(self, redis_client, prefix='extraction_stats'):
+        self.redis = redis_client
+        self.prefix = prefix
+        # Add the timings of every rule of a page in one round trip; the maximum needs a read, so it is kept atomic
+        # with the counters in Lua
+        self._record = self.redis.register_script("""
+            for i = 1, #ARGV, 3 do
+                local field, seconds = ARGV[i], tonumber(ARGV[i + 1])
+                redis.call('HINCRBY', KEYS[1], field .. '|calls', 1)
+                redis.call('HINCRBYFLOAT', KEYS[1], field .. '|total', seconds)
+                redis.call('HINCRBY', KEYS[1], field .. '|errors', ARGV[i + 2])
+                local peak = tonumber(redis.call('HGET', KEYS[1], field .. '|max'))
+                if not peak or seconds > peak then
+                    redis.call('HSET', KEYS[1], field .. '|max', ARGV[i + 1])
+                end
+            end
+            return 1
+        """)
+
+    def _key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def record(self, user_id, domain, timings):
+        """ Adds (rule name, seconds, failed) timings measured on one page of a user's domain profile. """
+        args = []
+        for name, seconds, failed in timings:
+            args.extend((f'{domain}|{name}', repr(seconds), int(failed)))
+        if not args:
+            return
+        try:
+            self._record(keys=[self._key(user_id)], args=args)
+        except Exception as e:
+            # Statistics are diagnostic only; the extracted fields are stored even when Redis is unavailable
+            logger.error(f"Failed to record extraction timings for {domain}: {e}")
+
+    def snapshot(self, user_id):
+        """
+        Returns the statistics of every rule of a user, across all crawler processes.
+
+        Args:
+        user_id: The user whose profiles' rules are reported.
+
+        Returns:
+        list: One dictionary per rule with its domain, name, call count, error count, and total, mean and maximum
+        time in milliseconds, sorted by total time.
+        """
+        rules = {}
+        for field, value in self.redis.hgetall(self._key(user_id)).items():
+            rule, _, figure = field.decode('utf-8').rpartition('|')
+            rules.setdefault(rule, {})[figure] = float(value)
+        stats = []
+        for rule, figures in rules.items():
+            domain, _, name = rule.partition('|')
+            calls, total = int(figures.get('calls', 0)), figures.get('total', 0.0)
+            stats.append({
+                'domain': domain,
+                'rule': name,
+                'calls': calls,
+                'errors': int(figures.get('errors', 0)),
+                'total_ms': round(total * 1000, 3),
+                'mean_ms': round(total * 1000 / calls, 3) if calls else 0.0,
+                'max_ms': round(figures.get('max', 0.0) * 1000, 3),
+            })
+        return sorted(stats, key=lambda entry: entry['total_ms'], reverse=True)
+
+
+class ProfileCache:
+    """
+    An LRU cache of compiled extraction profiles keyed by user and domain, shared by all crawler threads.
+
+    Every user has their own profile per domain, applied only to the pages that user crawls. Profiles are compiled
+    once and reused for every page of their domain. An entry is checked against the stored profile again after ttl
+    seconds and only recompiled if the stored version changed. Domains without a profile are cached too, so pages
+    of those domains do not query the database either.
+
+    Methods:
+    get(user_id, domain): Returns the compiled profile of a user for a domain, or None.
+    invalidate(user_id, domain): Drops a user's domain so its next page reloads the profile.
+
+    Attributes:
+    loader (callable): Returns (version, rules) for a user and domain, or None if there is no profile.
+    capacity (int): The maximum number of cached profiles.
+    ttl (float): Seconds after which an entry is checked against the stored profile again.
+    stats (ExtractionStats): Where the timing of every rule applied through the cache is recorded, if anywhere.
+    """
+
+    def __init__(self, loader, capacity=256, ttl=60, stats=None):
+        self.loader = loader
+        self.capacity = capacity
+        self.ttl = ttl
+        self.stats = stats
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, domain):
+        """
+        Returns the compiled profile of a user for a domain.
+
+        Args:
+        user_id: The user whose page is being parsed.
+        domain (str): The host name of the page, with or without 'www.'.
+
+        Returns:
+        CompiledProfile: The compiled profile, or None if the user has no profile for the domain.
+        """
+        key = (user_id, normalize_domain(domain))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                if now - entry[0] < self.ttl:
+                    return entry[1]
+
+        stored = self.loader(*key)
+        profile = entry[1] if entry is not None else None
+        if stored is None:
+            profile = None
+        elif profile is None or profile.version != stored[0]:
+            try:
+                profile = CompiledProfile(key[1], stored[1], version=stored[0], user_id=user_id)
+            except ValueError as e:
+                logger.error(f"Extraction profile of user {user_id} for {key[1]} could not be compiled: {e}")
+                profile = None
+
+        with self.lock:
+            self.entries[key] = (now, profile)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, user_id, domain):
+        """ Drops a user's domain from the cache. """
+        with self.lock:
+            self.entries.pop((user_id, normalize_domain(domain)), None)
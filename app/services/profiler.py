@@ -0,0 +1,327 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from ..utils.logger import logger, log_event
+
+
+class CrawlProfiler:
+    """
+    An opt-in stack-sampling profiler for crawl tasks.
+
+    While enabled, a fraction of crawl tasks (sample_rate) is registered by the thread running it. A sampler thread
+    wakes every interval seconds, reads the current stack of each registered thread with sys._current_frames(), and
+    counts it under the task's host and current stage ('setup', 'robots', 'fetch', 'parse' or 'store'). Unsampled
+    tasks and the rest of the process are never touched, and when the profiler is disabled the hooks in the crawl
+    path only check a flag.
+
+    The counts are written every flush_interval seconds and on disable to one file per stage, in the collapsed-stack
+    format read by flamegraph.pl and speedscope: one 'host;outer_frame;...;inner_frame count' line per stack. Each
+    enable starts a new session directory, so runs do not mix.
+
+    enable() and disable() only act on the current process. With a Redis client, publish() stores the setting
+    under key with the time it was saved, and every crawler process that called follow() polls it and applies
+    each new setting once, so a toggle made through any web process reaches the profilers of all of them.
+
+    Methods:
+    enable(sample_rate): Starts sampling tasks in this process.
+    disable(): Stops sampling in this process and writes the collected stacks.
+    publish(enabled, sample_rate): Stores the setting every following process applies.
+    load(): Returns the published setting.
+    sync(): Applies the published setting if it is newer than the last one applied.
+    follow(): Starts polling the published setting in a background thread.
+    unfollow(): Stops polling the published setting.
+    begin(url): Registers the calling thread's task if it is sampled.
+    set_stage(stage): Records the stage the calling thread's task has reached.
+    end(): Unregisters the calling thread's task.
+    flush(): Writes the collected stacks to the session directory.
+    status(): Returns the profiler state for monitoring.
+
+    Attributes:
+    directory (str): The directory session directories are created in.
+    sample_rate (float): The fraction of tasks that is profiled.
+    interval (float): Seconds between two stack samples.
+    flush_interval (float): Seconds between two writes of the collected stacks.
+    max_depth (int): The maximum number of frames kept per stack.
+    redis (StrictRedis): The Redis client the setting is published through, or None.
+    key (str): The Redis key holding the published setting.
+    poll_interval (float): Seconds between two polls of the published setting.
+    enabled (bool): Whether tasks are being sampled.
+    """
+
+    def __init__(self, directory, sample_rate=0.05, interval=0.005, flush_interval=30, max_depth=64,
+                 redis_client=None, key='crawler:profiler', poll_interval=1):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self.redis = redis_client
+        self.key = key
+        self.poll_interval = poll_interval
+        self.enabled = False
+        self.session_dir = None
+        self.tasks_sampled = 0
+        self.samples_taken = 0
+        # Thread id -> [stage, host] of the tasks being profiled
+        self._active = {}
+        self._counts = Counter()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._follower = None
+        self._unfollow = threading.Event()
+        # saved_at of the last published setting this process applied, so each toggle is applied once
+        self._applied_at = 0.0
+
+    def enable(self, sample_rate=None):
+        """
+        Starts sampling tasks in a new session directory. Calling it while enabled only changes the sample rate.
+
+        Args:
+        sample_rate (float): The fraction of tasks to profile. Defaults to the current sample rate.
+
+        Returns:
+        None
+        """
+        if sample_rate is not None:
+            self.sample_rate = min(1.0, max(0.0, sample_rate))
+        with self._lock:
+            if self.enabled:
+                return
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+            self.session_dir = os.path.join(self.directory, f'session-{stamp}-{os.getpid()}')
+            self._counts.clear()
+            self.tasks_sampled = 0
+            self.samples_taken = 0
+            self.enabled = True
+            self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+            self._thread.start()
+        log_event('profiler.enabled', f"Profiling {self.sample_rate:.1%} of crawl tasks into {self.session_dir}",
+                  sample_rate=self.sample_rate, directory=self.session_dir)
+
+    def disable(self):
+        """ Stops sampling, waits for the sampler thread and writes the collected stacks. """
+        with self._lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+            thread = self._thread
+        self._wakeup.set()
+        thread.join()
+        self.flush()
+        log_event('profiler.disabled', f"Profiling stopped, stacks written to {self.session_dir}",
+                  directory=self.session_dir, samples=self.samples_taken)
+
+    def publish(self, enabled, sample_rate=None):
+        """
+        Publishes a setting for the profilers of every crawler process. Without a Redis client, it is applied to
+        this process directly.
+
+        Args:
+        enabled (bool): Whether tasks should be sampled.
+        sample_rate (float): The fraction of tasks to profile. Defaults to the published, then the current, sample rate.
+
+        Returns:
+        dict: The published setting with 'enabled', 'sample_rate' and 'saved_at'.
+        """
+        if sample_rate is None:
+            published = self.load()
+            sample_rate = published['sample_rate'] if published else self.sample_rate
+        setting = {'enabled': bool(enabled), 'sample_rate': min(1.0, max(0.0, sample_rate)), 'saved_at': time.time()}
+        if self.redis is None:
+            self._apply(setting)
+        else:
+            self.redis.set(self.key, json.dumps(setting))
+        return setting
+
+    def load(self):
+        """ Returns the published setting, or None if nothing was published. """
+        if self.redis is None:
+            return None
+        saved = self.redis.get(self.key)
+        return json.loads(saved) if saved else None
+
+    def sync(self):
+        """
+        Applies the published setting if it was saved after the last one this process applied.
+
+        Returns:
+        bool: True if a new setting was applied.
+        """
+        setting = self.load()
+        if not setting or setting['saved_at'] <= self._applied_at:
+            return False
+        self._apply(setting)
+        return True
+
+    def _apply(self, setting):
+        self._applied_at = setting['saved_at']
+        if setting['enabled']:
+            self.enable(setting['sample_rate'])
+        else:
+            self.disable()
+
+    def follow(self):
+        """
+        Applies the published setting, if any, and starts a daemon thread that applies every later one. Does
+        nothing without a Redis client or if the thread is already running.
+
+        Returns:
+        threading.Thread: The polling thread, or None.
+        """
+        if self.redis is None:
+            return None
+        if self._follower is not None and self._follower.is_alive():
+            return self._follower
+        self._unfollow.clear()
+        try:
+            self.sync()
+        except Exception as e:
+            logger.error(f"Failed to load the profiler setting: {e}")
+
+        def loop():
+            while not self._unfollow.wait(self.poll_interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"Failed to load the profiler setting: {e}")
+
+        self._follower = threading.Thread(target=loop, daemon=True)
+        self._follower.start()
+        return self._follower
+
+    def unfollow(self):
+        """ Stops polling the published setting. """
+        self._unfollow.set()
+
+    def begin(self, url):
+        """
+        Registers the calling thread's task for sampling if the profiler is enabled and the task is sampled.
+
+        Args:
+        url (str): The URL of the task, whose host the samples are counted under.
+
+        Returns:
+        bool: True if the task is profiled, in which case end() must be called when it finishes.
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return False
+        host = urlparse(url).netloc or 'unknown'
+        with self._lock:
+            self._active[threading.get_ident()] = ['setup', host]
+            self.tasks_sampled += 1
+        self._wakeup.set()
+        return True
+
+    def set_stage(self, stage):
+        """ Records the stage the calling thread's task has reached. Does nothing for unprofiled tasks. """
+        if self._active:
+            entry = self._active.get(threading.get_ident())
+            if entry is not None:
+                entry[0] = stage
+
+    def end(self):
+        """ Unregisters the calling thread's task. """
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _label(self, code):
+        """ Returns the 'file:function' label of a code object, cached since stacks repeat the same code. """
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(';', ',').replace(' ', '_')
+            self._labels[code] = label
+        return label
+
+    def _sample(self):
+        """ Counts the current stack of every profiled thread under its stage and host. """
+        with self._lock:
+            active = {ident: tuple(entry) for ident, entry in self._active.items()}
+        if not active:
+            return False
+        frames = sys._current_frames()
+        stacks = []
+        for ident, (stage, host) in active.items():
+            frame = frames.get(ident)
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                labels.append(host.replace(';', ',').replace(' ', '_'))
+                stacks.append((stage, ';'.join(reversed(labels))))
+        del frames
+        with self._lock:
+            self._counts.update(stacks)
+            self.samples_taken += len(stacks)
+        return True
+
+    def _sample_loop(self):
+        """ Sampler thread: samples while tasks are registered, and sleeps until one is while none are. """
+        last_flush = time.monotonic()
+        while self.enabled:
+            if not self._sample():
+                self._wakeup.clear()
+                if not self._active:
+                    self._wakeup.wait(1)
+            else:
+                time.sleep(self.interval)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def flush(self):
+        """
+        Writes the stacks collected in the current session, one collapsed-stack file per stage.
+
+        Returns:
+        list: The paths of the written files.
+        """
+        if self.session_dir is None:
+            return []
+        with self._lock:
+            counts = list(self._counts.items())
+        by_stage = {}
+        for (stage, stack), count in counts:
+            by_stage.setdefault(stage, []).append(f'{stack} {count}\n')
+        if not by_stage:
+            return []
+        os.makedirs(self.session_dir, exist_ok=True)
+        paths = []
+        for stage, lines in by_stage.items():
+            path = os.path.join(self.session_dir, f'{stage}.collapsed')
+            try:
+                # Written in full under a temporary name, so readers never see a partial file
+                with open(path + '.tmp', 'w', encoding='utf-8') as collapsed:
+                    collapsed.writelines(lines)
+                os.replace(path + '.tmp', path)
+                paths.append(path)
+            except OSError as e:
+                logger.error(f"Failed to write profile {path}: {e}")
+        return paths
+
+    def status(self):
+        """
+        Returns the profiler state for monitoring.
+
+        Returns:
+        dict: Whether profiling is enabled in this process, the sample rate, the session directory, the number of
+        sampled tasks, stack samples and tasks being profiled right now, and the published setting.
+        """
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'session_dir': self.session_dir,
+            'tasks_sampled': self.tasks_sampled,
+            'samples': self.samples_taken,
+            'active': len(self._active),
+            'published': self.load(),
+        }
@@ -1,88 +1,273 @@
-import json
-import time
-import redis
-
-class RequestQueue:
-    """
-    A class representing a request queue for managing web crawling tasks, using Redis as the backend.
-
-    This queue prioritizes tasks based on their content type, with different priorities assigned to HTML, images, videos, and other types.
-
-    Methods:
-    add_request(user_id, url, content_type): Adds a new request to the queue with a calculated priority.
-    get_request(): Retrieves and removes the lowest-scored (highest priority) task from the queue.
-    is_empty(): Checks if the queue is empty.
-    print_queue(): Prints all tasks in the queue along with their priorities and scores.
-
-    Attributes:
-    redis (StrictRedis): A Redis client connected to the specified Redis server.
-    queue_name (str): The name of the Redis sorted set used to store the queue.
-    priority_map (dict): A mapping from content types to their corresponding priority scores.
-    """
-    def __init__(self) -> None:
-        self.redis = redis.StrictRedis(host='localhost', port=6379, db=1)
-        self.queue_name = "request_queue"
-        # Define a mapping from content types to priority scores
-        self.priority_map = {
-            'html': 10,
-            'image': 5,
-            'video': 1,
-            'other': 3
-        }
-
-    def add_request(self, user_id, url, content_type):
-        """
-        Adds a new request to the queue with a priority based on the content type.
-
-        Args:
-        user_id: The user ID associated with the request.
-        url: The URL to be crawled.
-        content_type: The type of content expected at the URL.
-
-        Returns:
-        None
-        """
-        # Determine the priority based on content type
-        priority = self.priority_map.get(content_type, self.priority_map['other'])
-        task = json.dumps({'user_id': user_id, 'url': url, 'content_type': content_type})
-        # Use current timestamp to differentiate tasks with the same priority
-        timestamp = time.time()
-        # Combine priority and timestamp to form a composite score
-        score = -priority * 100000 + timestamp
-        self.redis.zadd(self.queue_name, {task: score})
-
-    def get_request(self):
-        """
-        Retrieves and removes the lowest-scored (highest priority) task from the queue.
-
-        Returns:
-        The task in JSON format if the queue is not empty, otherwise None.
-        """
-        packed_request = self.redis.zpopmin(self.queue_name)
-        if packed_request:
-            task_data, _ = packed_request[0]
-            task = task_data.decode("utf-8")
-            return task
-        else:
-            return None
-
-    def is_empty(self):
-        """
-        Checks if the queue is empty.
-
-        Returns:
-        True if the queue is empty, False otherwise.
-        """
-        return self.redis.zcard(self.queue_name) == 0
-
-    def print_queue(self):
-        """
-        Prints all tasks in the queue along with their priorities and scores.
-
-        Returns:
-        None
-        """
-        all_items_with_scores = self.redis.zrange(self.queue_name, 0, -1, withscores=True)
-        for item, score in all_items_with_scores:
-            task = json.loads(item.decode("utf-8"))
-            print(f'User ID: {task["user_id"]}, URL: {task["url"]}, Content-Type: {task["content_type"]}, Priority: {score}')
+import json
+import time
+import redis
+
+class RequestQueue:
+    """
+    A class representing a request queue for managing web crawling tasks, using Redis as the backend.
+
+    This queue prioritizes tasks based on their content type, with different priorities assigned to HTML, images, videos, and other types.
+
+    Tasks that cannot run yet, e.g. because their host's politeness slot is not due, are parked in a delayed set
+    until a given time instead of going back into the queue, so workers take the tasks of other hosts meanwhile.
+    Parked tasks are moved back into the queue with their original score by the first get_request() after their
+    time has come.
+
+    Methods:
+    add_request(user_id, url, content_type): Adds a new request to the queue with a calculated priority.
+    add_requests(user_id, entries, content_type): Adds many requests in one round trip, each with an optional priority boost.
+    get_request(owner): Retrieves the lowest-scored (highest priority) task from the queue and marks it in flight for an owner.
+    ack(task): Marks an in-flight task as finished.
+    defer(task, delay): Parks an in-flight task for delay seconds, then returns it to the queue.
+    heartbeat(owner): Records that an owner of in-flight tasks is alive.
+    remove_owner(owner): Forgets an owner that stopped, so its leftover in-flight tasks can be reclaimed.
+    requeue_in_flight(lease, reclaim_owner): Returns tasks held by dead owners to the queue.
+    is_empty(): Checks if the queue is empty, including parked tasks.
+    size(): Returns the number of tasks ready to be taken from the queue.
+    delayed_size(): Returns the number of parked tasks.
+    print_queue(): Prints all tasks in the queue along with their priorities and scores.
+
+    Attributes:
+    redis (StrictRedis): A Redis client connected to the specified Redis server.
+    queue_name (str): The name of the Redis sorted set used to store the queue.
+    in_flight_name (str): The name of the Redis hash holding tasks that were taken but not yet finished, with their
+                          owner and score as 'owner|score'.
+    owners_name (str): The name of the Redis sorted set holding the last heartbeat time of every owner.
+    delayed_name (str): The name of the Redis sorted set holding parked tasks, scored by the time they become ready.
+    delayed_scores_name (str): The name of the Redis hash holding the queue score of every parked task.
+    priority_map (dict): A mapping from content types to their corresponding priority scores.
+    """
+    def __init__(self, host='localhost', port=6379, db=1) -> None:
+        self.redis = redis.StrictRedis(host=host, port=port, db=db)
+        self.queue_name = "request_queue"
+        self.in_flight_name = "request_queue:in_flight"
+        self.owners_name = "request_queue:owners"
+        self.delayed_name = "request_queue:delayed"
+        self.delayed_scores_name = "request_queue:delayed_scores"
+        # Move parked tasks whose time has come back into the queue, then pop the next task and record it as in
+        # flight, atomically, so a crash in between cannot lose a task
+        self._pop_to_in_flight = self.redis.register_script("""
+            local ready = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[2], 'LIMIT', 0, 100)
+            for _, task in ipairs(ready) do
+                local score = redis.call('HGET', KEYS[4], task)
+                if score then
+                    redis.call('ZADD', KEYS[1], score, task)
+                end
+                redis.call('ZREM', KEYS[3], task)
+                redis.call('HDEL', KEYS[4], task)
+            end
+            local item = redis.call('ZPOPMIN', KEYS[1])
+            if item[1] then
+                redis.call('HSET', KEYS[2], item[1], ARGV[1] .. '|' .. item[2])
+            end
+            return item[1]
+        """)
+        # Move the in-flight tasks of owners without a recent heartbeat back to the queue. Runs atomically, so two
+        # crawler processes reclaiming at the same time cannot both requeue a task, and a live worker's ack cannot
+        # interleave with it. Entries without an owner were written by older versions and are treated as dead.
+        self._requeue_dead = self.redis.register_script("""
+            local deadline = tonumber(ARGV[1]) - tonumber(ARGV[2])
+            local entries = redis.call('HGETALL', KEYS[2])
+            local moved = 0
+            for i = 1, #entries, 2 do
+                local task, value = entries[i], entries[i + 1]
+                local sep = string.find(value, '|', 1, true)
+                local owner, score = '', value
+                if sep then
+                    owner = string.sub(value, 1, sep - 1)
+                    score = string.sub(value, sep + 1)
+                end
+                local beat = redis.call('ZSCORE', KEYS[3], owner)
+                if owner == ARGV[3] or not beat or tonumber(beat) < deadline then
+                    redis.call('ZADD', KEYS[1], score, task)
+                    redis.call('HDEL', KEYS[2], task)
+                    moved = moved + 1
+                end
+            end
+            redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', deadline)
+            return moved
+        """)
+        # Park an in-flight task until a given time, keeping its queue score, in one step so it cannot be lost or
+        # requeued twice by a concurrent reclaim
+        self._defer = self.redis.register_script("""
+            local value = redis.call('HGET', KEYS[1], ARGV[1])
+            if not value then
+                return 0
+            end
+            local sep = string.find(value, '|', 1, true)
+            redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+            redis.call('HSET', KEYS[3], ARGV[1], sep and string.sub(value, sep + 1) or value)
+            redis.call('HDEL', KEYS[1], ARGV[1])
+            return 1
+        """)
+        # Define a mapping from content types to priority scores
+        self.priority_map = {
+            'html': 10,
+            'image': 5,
+            'video': 1,
+            'other': 3
+        }
+
+    def add_request(self, user_id, url, content_type):
+        """
+        Adds a new request to the queue with a priority based on the content type.
+
+        Args:
+        user_id: The user ID associated with the request.
+        url: The URL to be crawled.
+        content_type: The type of content expected at the URL.
+
+        Returns:
+        None
+        """
+        # Determine the priority based on content type
+        priority = self.priority_map.get(content_type, self.priority_map['other'])
+        # Use current timestamp to differentiate tasks with the same priority
+        timestamp = time.time()
+        task = json.dumps({'user_id': user_id, 'url': url, 'content_type': content_type, 'enqueued_at': timestamp})
+        # Combine priority and timestamp to form a composite score
+        score = -priority * 100000 + timestamp
+        self.redis.zadd(self.queue_name, {task: score})
+
+    def add_requests(self, user_id, entries, content_type='html'):
+        """
+        Adds a batch of requests to the queue in a single round trip.
+
+        Args:
+        user_id: The user ID associated with the requests.
+        entries: An iterable of (url, boost) pairs. The boost is a number between 0 and 1 that moves a URL ahead of
+                 others with the same content type, e.g. for recently modified pages.
+        content_type: The type of content expected at the URLs.
+
+        Returns:
+        int: The number of requests added.
+        """
+        priority = self.priority_map.get(content_type, self.priority_map['other'])
+        timestamp = time.time()
+        mapping = {}
+        for url, boost in entries:
+            task = json.dumps({'user_id': user_id, 'url': url, 'content_type': content_type, 'enqueued_at': timestamp})
+            mapping[task] = -(priority + boost) * 100000 + timestamp
+        if mapping:
+            self.redis.zadd(self.queue_name, mapping)
+        return len(mapping)
+
+    def get_request(self, owner=''):
+        """
+        Retrieves and removes the lowest-scored (highest priority) task from the queue. The task stays recorded as
+        in flight for its owner until ack() is called, so it can be recovered if the owner dies before finishing it.
+
+        Args:
+        owner (str): The id of the crawler process taking the task, kept alive with heartbeat().
+
+        Returns:
+        The task in JSON format if the queue is not empty, otherwise None.
+        """
+        task_data = self._pop_to_in_flight(
+            keys=[self.queue_name, self.in_flight_name, self.delayed_name, self.delayed_scores_name],
+            args=[owner, time.time()]
+        )
+        if task_data:
+            return task_data.decode("utf-8")
+        else:
+            return None
+
+    def ack(self, task):
+        """
+        Marks an in-flight task as finished.
+
+        Args:
+        task: The task in JSON format, exactly as returned by get_request().
+
+        Returns:
+        None
+        """
+        self.redis.hdel(self.in_flight_name, task)
+
+    def defer(self, task, delay):
+        """
+        Parks an in-flight task, e.g. because its host cannot be requested yet. The task is out of the queue until
+        delay seconds have passed, so workers take tasks for other hosts meanwhile, and then returns with its
+        original score.
+
+        Args:
+        task: The task in JSON format, exactly as returned by get_request().
+        delay (float): Seconds until the task can run.
+
+        Returns:
+        bool: True if the task was still in flight and was parked.
+        """
+        return bool(self._defer(keys=[self.in_flight_name, self.delayed_name, self.delayed_scores_name],
+                                args=[task, time.time() + delay]))
+
+    def heartbeat(self, owner):
+        """
+        Records that an owner of in-flight tasks is alive.
+
+        Args:
+        owner (str): The id of the crawler process.
+
+        Returns:
+        None
+        """
+        self.redis.zadd(self.owners_name, {owner: time.time()})
+
+    def remove_owner(self, owner):
+        """ Forgets an owner that stopped, so the next requeue_in_flight() anywhere reclaims what it left in flight. """
+        self.redis.zrem(self.owners_name, owner)
+
+    def requeue_in_flight(self, lease=30, reclaim_owner=''):
+        """
+        Moves the in-flight tasks of dead owners back into the queue with their original score. Tasks held by crawler
+        processes that are still heartbeating are left alone, so starting a second crawler does not steal work that
+        another process is still doing.
+
+        Args:
+        lease (float): Seconds without a heartbeat after which an owner is considered dead.
+        reclaim_owner (str): An owner whose tasks are requeued even though it is alive, used by a crawler process
+                             to recover its own tasks before its workers start again.
+
+        Returns:
+        int: The number of tasks returned to the queue.
+        """
+        return self._requeue_dead(keys=[self.queue_name, self.in_flight_name, self.owners_name],
+                                  args=[time.time(), lease, reclaim_owner])
+
+    def size(self):
+        """
+        Returns the number of tasks waiting in the queue, not counting parked tasks.
+
+        Returns:
+        int: The number of queued tasks.
+        """
+        return self.redis.zcard(self.queue_name)
+
+    def delayed_size(self):
+        """
+        Returns the number of parked tasks.
+
+        Returns:
+        int: The number of tasks parked by defer().
+        """
+        return self.redis.zcard(self.delayed_name)
+
+    def is_empty(self):
+        """
+        Checks if the queue is empty, including parked tasks.
+
+        Returns:
+        True if the queue is empty, False otherwise.
+        """
+        return self.redis.zcard(self.queue_name) == 0 and self.redis.zcard(self.delayed_name) == 0
+
+    def print_queue(self):
+        """
+        Prints all tasks in the queue along with their priorities and scores.
+
+        Returns:
+        None
+        """
+        all_items_with_scores = self.redis.zrange(self.queue_name, 0, -1, withscores=True)
+        for item, score in all_items_with_scores:
+            task = json.loads(item.decode("utf-8"))
+            print(f'User ID: {task["user_id"]}, URL: {task["url"]}, Content-Type: {task["content_type"]}, Priority: {score}')
@@ -0,0 +1,124 @@
+import json
+import time
+
+
+class ResultFeed:
+    """
+    A class publishing crawl results to a live per-user feed backed by Redis.
+
+    Every event is pushed onto a per-user Redis list trimmed to a fixed capacity, which acts as a ring buffer of the
+    most recent events, and is published on a per-user pub/sub channel. A client that connects, or reconnects with
+    the id of the last event it saw, first receives the buffered events it missed and then new events as they are
+    published, without querying the database.
+
+    Methods:
+    publish(user_id, event_type, data): Adds an event to the user's buffer and publishes it.
+    recent(user_id, after_id): Returns buffered events newer than an event id, oldest first.
+    stream(user_id, last_event_id, progress): Yields server-sent events for the user until the client disconnects.
+
+    Attributes:
+    redis (StrictRedis): The Redis client, shared with the request queue.
+    capacity (int): The number of events kept per user.
+    prefix (str): The prefix of the Redis keys and channels used by the feed.
+    progress_interval (float): Seconds between queue progress events on a stream.
+    heartbeat_interval (float): Seconds of silence after which a keep-alive comment is sent.
+    """
+
+    def __init__(self, redis_client, capacity=100, prefix='crawl_feed', progress_interval=5, heartbeat_interval=15):
+        self.redis = redis_client
+        self.capacity = capacity
+        self.prefix = prefix
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+        # Assign the id, buffer and publish the event atomically, so events of a user reach the buffer and the
+        # channel in id order even when several threads or processes publish at once. The type and data arrive
+        # JSON-encoded and are spliced into the entry, so Lua never re-encodes the payload.
+        self._publish = self.redis.register_script("""
+            local event_id = redis.call('INCR', KEYS[1])
+            local entry = '{"id": ' .. event_id .. ', "type": ' .. ARGV[1] .. ', "data": ' .. ARGV[2] .. '}'
+            redis.call('LPUSH', KEYS[2], entry)
+            redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[3]) - 1)
+            redis.call('PUBLISH', KEYS[3], entry)
+            return event_id
+        """)
+
+    def _buffer_key(self, user_id):
+        return f'{self.prefix}:{user_id}:events'
+
+    def _channel(self, user_id):
+        return f'{self.prefix}:{user_id}:channel'
+
+    def publish(self, user_id, event_type, data):
+        """
+        Adds an event to the user's ring buffer and publishes it to connected streams.
+
+        Args:
+        user_id: The user the event belongs to.
+        event_type (str): The SSE event name, e.g. 'result'.
+        data (dict): The JSON-serialisable event payload.
+
+        Returns:
+        int: The id of the event, increasing per user.
+        """
+        keys = [f'{self.prefix}:{user_id}:seq', self._buffer_key(user_id), self._channel(user_id)]
+        return int(self._publish(keys=keys, args=[json.dumps(event_type), json.dumps(data), self.capacity]))
+
+    def recent(self, user_id, after_id=0):
+        """
+        Returns the buffered events of a user that are newer than the given event id.
+
+        Args:
+        user_id: The user whose events to return.
+        after_id (int): Only events with a greater id are returned.
+
+        Returns:
+        list: Event dictionaries with 'id', 'type' and 'data', oldest first.
+        """
+        entries = [json.loads(raw) for raw in self.redis.lrange(self._buffer_key(user_id), 0, -1)]
+        return [entry for entry in reversed(entries) if entry['id'] > after_id]
+
+    @staticmethod
+    def format_event(entry):
+        """ Formats an event dictionary as a server-sent event. """
+        return f"id: {entry['id']}\nevent: {entry['type']}\ndata: {json.dumps(entry['data'])}\n\n"
+
+    def stream(self, user_id, last_event_id=0, progress=None):
+        """
+        Yields server-sent events for a user: missed buffered events first, then new events as they are published,
+        plus periodic queue progress events and keep-alive comments.
+
+        Args:
+        user_id: The user to stream events for.
+        last_event_id (int): The id of the last event the client received, from the Last-Event-ID header.
+        progress (callable): Optional function returning a dict of queue progress, sent every progress_interval seconds.
+
+        Returns:
+        A generator of SSE-formatted strings. It runs until the client disconnects.
+        """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        # Subscribe before reading the buffer so nothing published in between is missed
+        pubsub.subscribe(self._channel(user_id))
+        try:
+            last_sent = last_event_id
+            for entry in self.recent(user_id, last_event_id):
+                yield self.format_event(entry)
+                last_sent = entry['id']
+
+            last_progress = last_output = 0.0
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                now = time.monotonic()
+                if message is not None:
+                    entry = json.loads(message['data'])
+                    if entry['id'] > last_sent:
+                        last_sent = entry['id']
+                        last_output = now
+                        yield self.format_event(entry)
+                if progress is not None and now - last_progress >= self.progress_interval:
+                    last_progress = last_output = now
+                    yield f"event: progress\ndata: {json.dumps(progress())}\n\n"
+                elif now - last_output >= self.heartbeat_interval:
+                    last_output = now
+                    yield ": keep-alive\n\n"
+        finally:
+            pubsub.close()
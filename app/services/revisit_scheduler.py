@@ -0,0 +1,172 @@
+import math
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from ..models import RevisitState, db
+from ..utils.logger import logger
+
+
+class RevisitScheduler:
+    """
+    A class that keeps crawled pages fresh by re-enqueuing them at intervals adapted to how often they change.
+
+    Each fetch of a URL is recorded as a check, and checks whose content hash changed are counted as changes.
+    From these counts the scheduler estimates the page's change rate with the Cho & Garcia-Molina estimator,
+    which stays finite when every check saw a change:
+
+        rate = -ln((n - X + 0.5) / (n + 0.5)) / I
+
+    where n is the number of observed intervals, X the number of changes and I the mean interval between checks.
+    The revisit interval is 1 / rate, clamped between min_interval and max_interval. When the combined revisit
+    rate of all pages exceeds the global fetch budget, every interval is stretched by the same factor, so
+    fast-changing pages keep their relative priority over static ones.
+
+    Every crawler process runs its own scheduler, but the budget is global: a tick only enqueues after taking a
+    Redis lock that expires after poll_interval, so one tick runs per poll_interval across all processes.
+
+    Methods:
+    record_check(url, user_id, changed): Records a fetch result and reschedules the URL.
+    run_once(): Enqueues every URL that is due, within the per-tick share of the budget.
+    start(app): Starts the scheduler loop in a background thread.
+
+    Attributes:
+    request_queue (RequestQueue): The queue revisits are enqueued into.
+    budget_per_hour (int): The maximum number of revisit fetches per hour across all URLs.
+    min_interval (float): The shortest revisit interval in seconds.
+    max_interval (float): The longest revisit interval in seconds.
+    poll_interval (float): Seconds between scheduler ticks.
+    lock_key (str): The Redis key of the lock allowing one tick per poll_interval across processes.
+    stop_event (threading.Event): Event that stops the background loop when set.
+    scale (float): The factor by which intervals are currently stretched to respect the budget.
+    """
+
+    def __init__(self, request_queue, budget_per_hour=600, min_interval=3600, max_interval=30 * 86400,
+                 poll_interval=60, stop_event=None, lock_key='revisit_scheduler:tick'):
+        self.request_queue = request_queue
+        self.budget_per_hour = budget_per_hour
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.poll_interval = poll_interval
+        self.lock_key = lock_key
+        self.stop_event = stop_event or threading.Event()
+        self.scale = 1.0
+        self.thread = None
+
+    def estimate_interval(self, state):
+        """
+        Estimates the revisit interval of a URL from its change history.
+
+        Args:
+        state (RevisitState): The tracked state of the URL.
+
+        Returns:
+        float: The revisit interval in seconds, before budget scaling.
+        """
+        observed = state.check_count - 1
+        elapsed = (state.last_checked - state.first_checked).total_seconds()
+        if observed < 1 or elapsed <= 0:
+            # No history yet: start halfway (geometrically) between the bounds
+            return math.sqrt(self.min_interval * self.max_interval)
+
+        mean_interval = elapsed / observed
+        changes = min(state.change_count, observed)
+        rate = -math.log((observed - changes + 0.5) / (observed + 0.5)) / mean_interval
+        if rate <= 0:
+            return self.max_interval
+        return min(max(1.0 / rate, self.min_interval), self.max_interval)
+
+    def record_check(self, url, user_id, changed):
+        """
+        Records the result of fetching a URL and schedules its next visit. Must run inside an application context.
+
+        Args:
+        url (str): The fetched URL.
+        user_id (int): The user the URL belongs to.
+        changed (bool): True if the content hash differed from the previous fetch.
+
+        Returns:
+        RevisitState: The updated state of the URL.
+        """
+        now = datetime.utcnow()
+        state = RevisitState.query.filter_by(user_id=user_id, url=url).first()
+        if state is None:
+            state = RevisitState(user_id=user_id, url=url, interval=self.max_interval, checked_at=now)
+            db.session.add(state)
+        elif changed:
+            state.change_count += 1
+            state.last_changed = now
+
+        state.check_count += 1
+        state.last_checked = now
+        state.interval = self.estimate_interval(state)
+        state.next_visit = now + timedelta(seconds=state.interval * self.scale)
+        db.session.commit()
+        return state
+
+    def update_scale(self):
+        """
+        Recomputes the stretch factor that keeps the total revisit rate within the hourly budget.
+
+        Returns:
+        float: The new scale factor (1.0 when the budget is not exceeded).
+        """
+        demand_per_second = db.session.query(func.sum(1.0 / RevisitState.interval)).scalar() or 0.0
+        budget_per_second = self.budget_per_hour / 3600.0
+        self.scale = max(1.0, demand_per_second / budget_per_second) if budget_per_second > 0 else 1.0
+        return self.scale
+
+    def run_once(self):
+        """
+        Enqueues every URL whose next visit is due, limited to this tick's share of the hourly budget. Does nothing
+        if another process ran a tick less than poll_interval ago. Must run inside an application context.
+
+        Returns:
+        int: The number of URLs enqueued, 0 if another process already ran this tick.
+        """
+        # The lock is left to expire rather than released, so it also spaces out ticks of different processes
+        if not self.request_queue.redis.set(self.lock_key, 1, nx=True, px=int(self.poll_interval * 1000)):
+            return 0
+        self.update_scale()
+        now = datetime.utcnow()
+        limit = max(1, math.ceil(self.budget_per_hour * self.poll_interval / 3600.0))
+        due = RevisitState.query.filter(RevisitState.next_visit <= now) \
+            .order_by(RevisitState.next_visit).limit(limit).all()
+        for state in due:
+            self.request_queue.add_request(user_id=state.user_id, url=state.url, content_type='html')
+            # Push the next visit out until the worker records the fetch, so a slow queue doesn't cause duplicates
+            state.next_visit = now + timedelta(seconds=state.interval * self.scale)
+        db.session.commit()
+        if due:
+            logger.info(f"Revisit scheduler enqueued {len(due)} URLs (scale {self.scale:.2f})")
+        return len(due)
+
+    def start(self, app):
+        """
+        Starts the scheduler loop in a daemon thread running inside the given application's context.
+        Does nothing if the loop is already running.
+
+        Args:
+        app (Flask): The Flask application providing the database context.
+
+        Returns:
+        threading.Thread: The started thread.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return self.thread
+        self.stop_event.clear()
+
+        def loop():
+            with app.app_context():
+                while not self.stop_event.is_set():
+                    try:
+                        self.run_once()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error(f"Revisit scheduler error: {e}")
+                    self.stop_event.wait(self.poll_interval)
+
+        self.thread = threading.Thread(target=loop, daemon=True)
+        self.thread.start()
+        return self.thread
@@ -0,0 +1,204 @@
+import gzip
+import io
+import threading
+import xml.etree.ElementTree as ET
+from datetime import date
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from ..utils import robots_parser, url_utils
+from ..utils.logger import logger
+from .extraction import normalize_domain
+
+# Paths probed when robots.txt does not declare any sitemap
+WELL_KNOWN_PATHS = ['/sitemap.xml', '/sitemap_index.xml', '/sitemap.xml.gz']
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag):
+    """ Strips the XML namespace from an element tag, e.g. '{http://...}loc' -> 'loc'. """
+    return tag.rsplit('}', 1)[-1]
+
+
+def lastmod_boost(lastmod, today=None):
+    """
+    Converts a sitemap <lastmod> value into a queue priority boost between 0 and 1, higher for recent changes.
+
+    Args:
+    lastmod (str): A W3C datetime such as '2024-01-31' or '2024-01-31T10:00:00+00:00'.
+    today (date): The reference date. Defaults to today.
+
+    Returns:
+    float: 1.0 for a page modified today, decaying towards 0 with age; 0.0 if lastmod is missing or invalid.
+    """
+    if not lastmod:
+        return 0.0
+    try:
+        modified = date.fromisoformat(lastmod.strip()[:10])
+    except ValueError:
+        return 0.0
+    age_days = max(((today or date.today()) - modified).days, 0)
+    return 1.0 / (1.0 + age_days / 30.0)
+
+
+class SitemapDiscovery:
+    """
+    A class that seeds the request queue from a site's sitemaps instead of discovering URLs page by page.
+
+    Sitemaps are found through the 'Sitemap:' lines of robots.txt and, failing that, a few well-known paths.
+    Each sitemap is streamed and parsed incrementally with ElementTree.iterparse, clearing elements as soon as
+    they are read, so memory stays bounded even for large or gzipped files. Sitemap indexes are followed
+    breadth-first, and page URLs are fed to the queue in batches with a priority boost based on <lastmod>.
+    As the sitemap protocol requires, nested sitemaps and page URLs are only followed on the host of the site
+    being discovered; entries pointing at other hosts are skipped. Hosts are compared without 'www.' and port.
+
+    Methods:
+    find_sitemaps(site_url): Returns the candidate sitemap URLs for a site.
+    iter_sitemap(sitemap_url): Streams (kind, loc, lastmod) entries out of one sitemap or sitemap index.
+    discover(site_url, user_id): Walks all sitemaps of a site and enqueues the URLs they list.
+    start(site_url, user_id): Runs discover in a background thread.
+
+    Attributes:
+    request_queue (RequestQueue): The queue discovered URLs are added to.
+    max_urls (int): The maximum number of page URLs enqueued per discovery run.
+    max_sitemaps (int): The maximum number of sitemap files fetched per discovery run.
+    batch_size (int): The number of URLs sent to the queue per round trip.
+    timeout (int): The request timeout in seconds.
+    """
+
+    def __init__(self, request_queue, max_urls=50000, max_sitemaps=500, batch_size=1000, timeout=10):
+        self.request_queue = request_queue
+        self.max_urls = max_urls
+        self.max_sitemaps = max_sitemaps
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def find_sitemaps(self, site_url):
+        """
+        Returns the candidate sitemap URLs for a site.
+
+        Args:
+        site_url (str): Any URL on the site.
+
+        Returns:
+        list: Sitemaps declared in robots.txt, or the well-known sitemap paths if none are declared.
+        """
+        parsed = urlparse(site_url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        try:
+            declared = robots_parser.RobotsParser(origin).site_maps()
+        except Exception as e:
+            logger.warning(f"Could not read robots.txt for {origin}: {e}")
+            declared = []
+        if declared:
+            return list(dict.fromkeys(declared))
+        return [urljoin(origin, path) for path in WELL_KNOWN_PATHS]
+
+    def iter_sitemap(self, sitemap_url):
+        """
+        Streams the entries of a sitemap or sitemap index without loading the whole document.
+
+        Args:
+        sitemap_url (str): The URL of the sitemap, optionally gzip-compressed.
+
+        Returns:
+        A generator of (kind, loc, lastmod) tuples, where kind is 'url' for pages and 'sitemap' for nested sitemaps.
+        """
+        with requests.get(sitemap_url, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                logger.info(f"No sitemap at {sitemap_url} - Status Code: {response.status_code}")
+                return
+            response.raw.decode_content = True
+            # urllib3 closes the raw stream at EOF by default, and the buffered reader's next read would then fail
+            response.raw.auto_close = False
+            stream = io.BufferedReader(response.raw)
+            # .gz sitemaps may arrive still compressed, or already decoded through Content-Encoding
+            if stream.peek(2)[:2] == GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)
+
+            root = None
+            loc, lastmod = None, None
+            for event, elem in ET.iterparse(stream, events=('start', 'end')):
+                if root is None:
+                    root = elem
+                if event != 'end':
+                    continue
+                name = _local_name(elem.tag)
+                if name == 'loc':
+                    loc = (elem.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = (elem.text or '').strip()
+                elif name in ('url', 'sitemap'):
+                    if loc:
+                        yield name, loc, lastmod
+                    loc, lastmod = None, None
+                    # Drop everything parsed so far so memory does not grow with the document
+                    root.clear()
+
+    def discover(self, site_url, user_id):
+        """
+        Walks every sitemap of a site, following sitemap indexes, and enqueues the page URLs they list.
+
+        Args:
+        site_url (str): Any URL on the site to discover.
+        user_id: The user the discovered URLs are enqueued for.
+
+        Returns:
+        int: The number of URLs added to the request queue.
+        """
+        pending = self.find_sitemaps(site_url)
+        # Compared without 'www.' or port, so a site started from example.com keeps the www.example.com URLs its
+        # sitemaps list after the usual apex to www redirect
+        host = normalize_domain(site_url)
+        seen_sitemaps, seen_urls = set(pending), set()
+        batch, enqueued, fetched, foreign = [], 0, 0, 0
+
+        while pending and fetched < self.max_sitemaps and enqueued + len(batch) < self.max_urls:
+            sitemap_url = pending.pop(0)
+            fetched += 1
+            try:
+                for kind, loc, lastmod in self.iter_sitemap(sitemap_url):
+                    if normalize_domain(loc) != host:
+                        foreign += 1
+                        continue
+                    if kind == 'sitemap':
+                        if loc not in seen_sitemaps:
+                            seen_sitemaps.add(loc)
+                            pending.append(loc)
+                        continue
+                    if loc in seen_urls or not url_utils.is_valid_url(loc):
+                        continue
+                    seen_urls.add(loc)
+                    batch.append((loc, lastmod_boost(lastmod)))
+                    if len(batch) >= self.batch_size:
+                        enqueued += self.request_queue.add_requests(user_id, batch)
+                        batch = []
+                    if enqueued + len(batch) >= self.max_urls:
+                        break
+            except Exception as e:
+                # One unreadable sitemap must not end the run or lose the URLs already batched
+                logger.warning(f"Failed to read sitemap {sitemap_url}: {e}")
+
+        if batch:
+            enqueued += self.request_queue.add_requests(user_id, batch)
+        if foreign:
+            logger.info(f"Sitemap discovery for {site_url} skipped {foreign} entries on other hosts")
+        logger.info(f"Sitemap discovery for {site_url} read {fetched} sitemaps and enqueued {enqueued} URLs")
+        return enqueued
+
+    def start(self, site_url, user_id):
+        """
+        Runs discover in a daemon thread so a web request does not wait for large sitemaps.
+
+        Args:
+        site_url (str): Any URL on the site to discover.
+        user_id: The user the discovered URLs are enqueued for.
+
+        Returns:
+        threading.Thread: The started thread.
+        """
+        thread = threading.Thread(target=self.discover, args=(site_url, user_id), daemon=True)
+        thread.start()
+        return thread
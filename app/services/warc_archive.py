@@ -0,0 +1,242 @@
+import gzip
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+
+# Compiled extraction profiles and HTML content types of a reparse worker process, set up by _init_reparse_worker
+_worker_profiles = None
+_worker_html_types = None
+
+# Hop-by-hop and transfer headers that no longer describe the body once requests has decoded it.
+DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+class WarcArchive:
+    """
+    A class that writes raw HTTP responses into rotating, gzip-compressed WARC files together with an offset index,
+    so pages can be re-parsed later without fetching them again.
+
+    Every record is written as its own gzip member, which keeps each record independently seekable: the index
+    stores the file name, byte offset and compressed length of every record, and a reader only has to seek
+    to the offset and decompress that slice.
+
+    Methods:
+    write_response(url, response, body): Appends a response record for the given requests.Response to the current WARC file.
+    iter_index(): Yields the index entries of every archived record, oldest first.
+    read_record(entry): Reads and decodes a single record from its index entry.
+
+    Attributes:
+    directory (str): The directory where WARC files and the index are stored.
+    max_bytes (int): The size after which the current WARC file is closed and a new one is started.
+    index_path (str): The path of the JSON-lines offset index.
+    lock (threading.Lock): A lock serialising writes from concurrent crawl threads.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.jsonl')
+        self.lock = threading.Lock()
+        self._current_path = None
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _new_path(self):
+        """ Builds a unique file name for a new WARC file. """
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+        return os.path.join(self.directory, f'crawl-{stamp}-{os.getpid()}.warc.gz')
+
+    def _target_path(self, incoming):
+        """ Returns the WARC file to write to, rotating when the current one would exceed max_bytes. """
+        if self._current_path is None:
+            self._current_path = self._new_path()
+        elif os.path.getsize(self._current_path) + incoming > self.max_bytes:
+            self._current_path = self._new_path()
+        return self._current_path
+
+    @staticmethod
+    def _http_block(response, body):
+        """ Serialises the status line, headers and body of a response into an HTTP/1.1 message. """
+        lines = [f"HTTP/1.1 {response.status_code} {response.reason or ''}".rstrip()]
+        for name, value in response.headers.items():
+            if name.lower() not in DROPPED_HEADERS:
+                lines.append(f'{name}: {value}')
+        lines.append(f'Content-Length: {len(body)}')
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8', errors='replace')
+        return head + body
+
+    def write_response(self, url, response, body=None):
+        """
+        Appends a WARC response record for a fetched page and records its location in the index.
+
+        Args:
+        url (str): The URL the response was fetched from.
+        response (requests.Response): The response whose status and headers should be archived.
+        body (bytes): The body as read by the crawler, which may be truncated. Defaults to response.content.
+
+        Returns:
+        dict: The index entry written for the record.
+        """
+        block = self._http_block(response, response.content if body is None else body)
+        date = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        warc_headers = (
+            'WARC/1.0\r\n'
+            'WARC-Type: response\r\n'
+            f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n'
+            f'WARC-Date: {date}\r\n'
+            f'WARC-Target-URI: {url}\r\n'
+            'Content-Type: application/http; msgtype=response\r\n'
+            f'Content-Length: {len(block)}\r\n'
+            '\r\n'
+        ).encode('utf-8')
+        record = gzip.compress(warc_headers + block + b'\r\n\r\n')
+
+        with self.lock:
+            path = self._target_path(len(record))
+            with open(path, 'ab') as warc_file:
+                offset = warc_file.tell()
+                warc_file.write(record)
+            entry = {
+                'url': url,
+                'file': os.path.basename(path),
+                'offset': offset,
+                'length': len(record),
+                'date': date,
+            }
+            with open(self.index_path, 'a', encoding='utf-8') as index_file:
+                index_file.write(json.dumps(entry) + '\n')
+        return entry
+
+    def iter_index(self, latest_only=True):
+        """
+        Yields the index entries of archived records, oldest first.
+
+        The index is streamed rather than loaded: duplicates are only collapsed within a run of consecutive entries
+        of the same WARC file, so memory is bounded by the size of one file and entries are yielded while the rest
+        of the index is still being read. A URL archived in several files is yielded once per file, in index order,
+        so consumers that apply entries in order end with the most recent record.
+
+        Args:
+        latest_only (bool): When True, only the most recent record of a URL within each WARC file is yielded.
+
+        Returns:
+        A generator of index entry dictionaries.
+        """
+        if not os.path.exists(self.index_path):
+            return
+        run_file, run = None, {}
+        with open(self.index_path, encoding='utf-8') as index_file:
+            for line in index_file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if not latest_only:
+                    yield entry
+                    continue
+                if entry['file'] != run_file:
+                    yield from run.values()
+                    run_file, run = entry['file'], {}
+                # Re-inserting moves the URL to the end, keeping the run in the order of the latest records
+                run.pop(entry['url'], None)
+                run[entry['url']] = entry
+        yield from run.values()
+
+    def read_record(self, entry):
+        """
+        Reads a single record from the archive using its index entry.
+
+        Args:
+        entry (dict): An index entry as produced by write_response.
+
+        Returns:
+        A tuple (url, status_code, headers, body) where headers is a dict with lower-cased names.
+        """
+        with open(os.path.join(self.directory, entry['file']), 'rb') as warc_file:
+            warc_file.seek(entry['offset'])
+            raw = gzip.decompress(warc_file.read(entry['length']))
+
+        _, http_block = raw.split(b'\r\n\r\n', 1)
+        http_head, body = http_block.split(b'\r\n\r\n', 1)
+        if body.endswith(b'\r\n\r\n'):
+            body = body[:-4]
+        head_lines = http_head.decode('utf-8', errors='replace').split('\r\n')
+        status_code = int(head_lines[0].split(' ')[1])
+        headers = {}
+        for line in head_lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return entry['url'], status_code, headers, body
+
+
+def _init_reparse_worker(profiles, html_types):
+    """
+    Sets up a reparse worker process with the profiles and HTML content types passed by the parent. The profiles
+    are compiled once and grouped by domain, then by user.
+    """
+    global _worker_profiles, _worker_html_types
+    from .extraction import CompiledProfile
+    from ..utils.logger import logger
+
+    _worker_html_types = tuple(html_types)
+    _worker_profiles = {}
+    for (user_id, domain), (version, rules) in (profiles or {}).items():
+        try:
+            compiled = CompiledProfile(domain, rules, version=version, user_id=user_id)
+        except ValueError as e:
+            logger.error(f"Extraction profile of user {user_id} for {domain} could not be compiled: {e}")
+            continue
+        _worker_profiles.setdefault(domain, {})[user_id] = compiled
+
+
+def _reparse_entry(args):
+    """
+    Re-runs extraction on one archived record. Runs inside a worker process, so it only relies on picklable arguments.
+
+    Args:
+    args (tuple): The archive directory and the index entry to re-parse.
+
+    Returns:
+    The extraction result dictionary, with the fields captured by each user's profile for the page's domain under
+    'extracted_by_user', or None if the record is not an HTML page.
+    """
+    from .crawler import HTML_CONTENT_TYPES, WebCrawler
+    from .extraction import normalize_domain
+
+    directory, entry = args
+    url, status_code, headers, body = WarcArchive(directory).read_record(entry)
+    content_type = headers.get('content-type') or ''
+    # Same gate as WebCrawler.crawl: pages without a Content-Type were parsed as HTML when they were fetched
+    mime_type = content_type.split(';')[0].strip().lower()
+    if status_code != 200 or (mime_type and mime_type not in (_worker_html_types or HTML_CONTENT_TYPES)):
+        return None
+    user_profiles = (_worker_profiles or {}).get(normalize_domain(url))
+    return WebCrawler(url).parse(url, body, content_type, user_profiles=user_profiles)
+
+
+def reparse_archive(directory, processes=None, chunksize=64, profiles=None, html_types=None):
+    """
+    Re-runs page extraction over every archived URL in parallel across CPU cores.
+
+    Args:
+    directory (str): The directory holding the WARC files and index.
+    processes (int): The number of worker processes. Defaults to the number of CPUs.
+    chunksize (int): The number of records handed to a worker process at a time.
+    profiles (dict): Extraction profiles to apply, as (version, rules) keyed by (user id, domain). Each worker
+    process compiles them once, and every user's profile for a page's domain is applied to the same parsed tree.
+    html_types (tuple): Content types parsed as HTML pages, as configured for the crawler. Records without a
+    Content-Type are parsed too, as they are when crawled.
+
+    Returns:
+    A generator yielding extraction result dictionaries in index order, so when a URL was archived more than once
+    its most recent record comes last.
+    """
+    from multiprocessing import Pool
+
+    archive = WarcArchive(directory)
+    jobs = ((directory, entry) for entry in archive.iter_index())
+    with Pool(processes=processes, initializer=_init_reparse_worker, initargs=(profiles, html_types or ())) as pool:
+        for result in pool.imap(_reparse_entry, jobs, chunksize=chunksize):
+            if result:
+                yield result
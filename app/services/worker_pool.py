@@ -0,0 +1,495 @@
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlparse
+
+from ..utils.logger import logger, log_event
+
+
+class HostPoliteness:
+    """
+    A class that spaces out requests to the same host by a fixed delay, shared by all worker threads.
+
+    Methods:
+    reserve(host): Reserves a host's request slot if it is due, or returns how long until it is.
+    snapshot(): Returns the schedule for checkpointing.
+    restore(next_allowed): Restores a checkpointed schedule.
+
+    Attributes:
+    delay (float): Minimum number of seconds between two requests to the same host.
+    next_allowed (dict): A mapping of host names to the earliest time the next request may be sent.
+    lock (threading.Lock): A lock protecting the schedule.
+    """
+
+    def __init__(self, delay=2):
+        self.delay = delay
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, host):
+        """
+        Reserves the request slot of a host if it is due. Nothing is reserved otherwise, so a worker can take a task
+        for another host instead of waiting.
+
+        Args:
+        host (str): The host about to be requested.
+
+        Returns:
+        float: 0 if the slot was reserved and the request can be sent now, otherwise the number of seconds until
+        the host can be requested.
+        """
+        now = time.time()
+        with self.lock:
+            slot = self.next_allowed.get(host, 0)
+            if slot > now:
+                return slot - now
+            self.next_allowed[host] = now + self.delay
+        return 0.0
+
+    def snapshot(self):
+        """ Returns the hosts whose next slot is still in the future. """
+        now = time.time()
+        with self.lock:
+            return {host: ts for host, ts in self.next_allowed.items() if ts > now}
+
+    def restore(self, next_allowed):
+        """ Merges a checkpointed schedule into the current one. """
+        with self.lock:
+            for host, ts in next_allowed.items():
+                self.next_allowed[host] = max(ts, self.next_allowed.get(host, 0))
+
+
+class PoolMetrics:
+    """
+    A class keeping a sliding window of recent task outcomes, used to monitor and scale the worker pool.
+
+    Methods:
+    record(duration, failed): Records the duration and outcome of one task.
+    snapshot(): Returns the median latency, error rate and sample count of the window.
+
+    Attributes:
+    samples (deque): The most recent (duration, failed) pairs.
+    lock (threading.Lock): A lock protecting the window.
+    """
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, duration, failed):
+        """ Records the duration in seconds and the outcome of one task. """
+        with self.lock:
+            self.samples.append((duration, failed))
+
+    def snapshot(self):
+        """
+        Returns statistics over the window.
+
+        Returns:
+        dict: 'latency_p50' in seconds (None without samples), 'error_rate' between 0 and 1, and 'samples'.
+        """
+        with self.lock:
+            samples = list(self.samples)
+        if not samples:
+            return {'latency_p50': None, 'error_rate': 0.0, 'samples': 0}
+        return {
+            'latency_p50': statistics.median(duration for duration, _ in samples),
+            'error_rate': sum(1 for _, failed in samples if failed) / len(samples),
+            'samples': len(samples),
+        }
+
+
+class CrawlWorkerPool:
+    """
+    A class managing the crawl worker threads, with start, pause, resume, drain and stop controls.
+
+    Workers take tasks from the request queue, skip URLs that were already processed after the task was enqueued,
+    and hand the task to the handler once its host's politeness slot is due. A task whose host is not ready yet is
+    parked in the queue's delayed set until the slot is due, and the worker takes the next task, so the tasks of
+    one busy host never hold workers or block the tasks of other hosts, however far ahead of them they are queued. Progress is checkpointed through
+    CrawlCheckpoint. The duration and outcome of every task are recorded in PoolMetrics, and the number of workers
+    can be changed while running with resize().
+
+    Several crawler processes can share one queue. Each pool takes tasks under its own owner id and a control
+    thread heartbeats that id, so tasks are only returned to the queue when the process holding them is dead, never
+    while another process is still working on them. Pause, resume, drain and stop_all are published through the
+    checkpointed state, and the control thread of every process polls it, so a control issued through any web
+    process reaches the workers of all of them. The control thread also reports this process's status, together with
+    that of the reporters registered by other services, such as the autoscaler, so processes() returns the status
+    of every crawler process from any of them.
+
+    Methods:
+    start(): Restores the checkpoint and starts the worker threads and the control thread of this process.
+    pause(): Lets workers of every process finish their current task and then wait without taking new ones.
+    resume(): Lets workers of every process take tasks again, restarting stopped ones.
+    drain(): Lets workers of every process empty the queue and then exit.
+    stop_all(): Stops the workers of every process after their current task.
+    stop(): Stops this process's workers and control thread, e.g. when the process shuts down.
+    resize(num_workers): Starts or retires workers to reach the given number.
+    status(): Returns the pool state of this process for monitoring.
+    progress(): Returns the crawl progress shared by every crawler process.
+    processes(): Returns the status reported by every live crawler process.
+
+    Attributes:
+    app (Flask): The application whose context workers run in.
+    request_queue (RequestQueue): The queue tasks are taken from.
+    handler (callable): The function that processes one decoded task. It may return 'failed' to count the task as an
+                        error, which should be reserved for failures caused by load on the host.
+    checkpoint (CrawlCheckpoint): Where crawler state is persisted.
+    num_workers (int): The target number of worker threads.
+    metrics (PoolMetrics): Latency and error rate of recent tasks.
+    politeness (HostPoliteness): The shared per-host request schedule.
+    idle_wait (float): Seconds a worker waits when the queue is empty or the pool is paused.
+    checkpoint_interval (float): Seconds between periodic checkpoints.
+    control_interval (float): Seconds between two polls of the shared state.
+    heartbeat_interval (float): Seconds between two heartbeats and reclaims of dead owners' tasks.
+    lease (float): Seconds without a heartbeat after which another process's in-flight tasks are reclaimed.
+    owner (str): The id this process takes tasks under.
+    reporters (dict): Callables returning the status of other services of this process, reported under their key.
+    state (str): One of 'stopped', 'running', 'paused' or 'draining'.
+    """
+
+    def __init__(self, app, request_queue, handler, checkpoint, num_workers=5, politeness_delay=2,
+                 idle_wait=0.5, checkpoint_interval=5, control_interval=1, heartbeat_interval=5, lease=30):
+        self.app = app
+        self.request_queue = request_queue
+        self.handler = handler
+        self.checkpoint = checkpoint
+        self.num_workers = num_workers
+        self.politeness = HostPoliteness(politeness_delay)
+        self.idle_wait = idle_wait
+        self.checkpoint_interval = checkpoint_interval
+        self.control_interval = control_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.lease = lease
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.state = 'stopped'
+        self.workers = []
+        self.stop_event = threading.Event()
+        self.run_event = threading.Event()
+        self.shutdown_event = threading.Event()
+        self.lock = threading.Lock()
+        self.metrics = PoolMetrics()
+        self.reporters = {}
+        self._control = None
+        # Whether this process crawls; a pool that was never started only publishes controls
+        self._started = False
+        self._last_checkpoint = 0.0
+        # saved_at of the last shared state this process applied, so each control is applied once
+        self._applied_at = 0.0
+        # Number of running workers asked to exit after their current task, used to shrink the pool
+        self._retiring = 0
+
+    def start(self):
+        """
+        Restores the checkpoint, starts the worker threads and the control thread. If the shared state is paused,
+        the workers start paused.
+
+        Returns:
+        int: The number of in-flight tasks of dead owners that were returned to the queue.
+        """
+        with self.lock:
+            if any(worker.is_alive() for worker in self.workers):
+                return 0
+            self.request_queue.heartbeat(self.owner)
+            self.politeness.restore(self.checkpoint.load_hosts())
+            state, self._applied_at = self.checkpoint.load_state()
+            requeued = self._start_workers('paused' if state == 'paused' else 'running')
+            self._started = True
+            if self._control is None or not self._control.is_alive():
+                self.shutdown_event.clear()
+                self._control = threading.Thread(target=self._control_loop, daemon=True)
+                self._control.start()
+        logger.info(f"Crawler {self.owner} started with {self.num_workers} workers, {requeued} in-flight tasks requeued")
+        return requeued
+
+    def pause(self):
+        """ Pauses the workers of every crawler process. """
+        self._apply('paused')
+        self._publish('paused')
+
+    def resume(self):
+        """ Resumes the workers of every crawler process, restarting workers that were stopped or drained. """
+        self._apply('running')
+        self._publish('running')
+
+    def drain(self):
+        """ Lets the workers of every crawler process keep taking tasks until the queue is empty, then exit. """
+        self._apply('draining')
+        self._publish('draining')
+
+    def stop_all(self):
+        """ Stops the workers of every crawler process after their current task. Their control threads keep
+        polling, so resume() starts them again. """
+        self._apply('stopped')
+        self._publish('stopped')
+
+    def stop(self, timeout=None):
+        """
+        Stops this process's workers after their current task, and its control thread. Used when the process
+        shuts down; other crawler processes are not affected. Tasks this process leaves in flight are reclaimed by
+        the next crawler process that starts or reclaims.
+
+        Args:
+        timeout (float): Maximum number of seconds to wait for each worker.
+
+        Returns:
+        None
+        """
+        self._started = False
+        self.shutdown_event.set()
+        self._stop_workers(timeout)
+        if self._control is not None:
+            self._control.join(timeout)
+        try:
+            self.request_queue.remove_owner(self.owner)
+            self.checkpoint.remove_status(self.owner)
+        except Exception as e:
+            logger.error(f"Failed to unregister crawler {self.owner}: {e}")
+
+    def _publish(self, state):
+        """ Saves a requested state for the control threads of the other crawler processes. """
+        try:
+            self._applied_at = self.checkpoint.save_state(state)
+        except Exception as e:
+            logger.error(f"Failed to publish crawler state {state}: {e}")
+
+    def _apply(self, state):
+        """ Brings this process's workers to a requested state, if this process crawls. """
+        if not self._started:
+            return
+        alive = any(worker.is_alive() for worker in self.workers)
+        if state == 'stopped':
+            if alive:
+                self._stop_workers()
+        elif not alive:
+            if state == 'running':
+                with self.lock:
+                    self._start_workers(state)
+        elif state == 'paused':
+            self.run_event.clear()
+            self.state = 'paused'
+        else:
+            self.state = state
+            self.run_event.set()
+
+    def _start_workers(self, state):
+        """ Recovers this process's leftover tasks and starts the workers. Must be called with the lock held. """
+        self.stop_event.clear()
+        requeued = self.request_queue.requeue_in_flight(self.lease, reclaim_owner=self.owner)
+        self.state = state
+        if state == 'paused':
+            self.run_event.clear()
+        else:
+            self.run_event.set()
+        self.workers = []
+        self._retiring = 0
+        self._spawn(self.num_workers)
+        return requeued
+
+    def _stop_workers(self, timeout=None):
+        """ Stops the workers after their current task and checkpoints the politeness schedule. """
+        self.stop_event.set()
+        # Wake paused workers so they can see the stop event
+        self.run_event.set()
+        for worker in self.workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout)
+        self.state = 'stopped'
+        self.save_checkpoint()
+
+    def _control_loop(self):
+        """ Control thread: heartbeats, reports the status, reclaims dead owners' tasks and follows the shared state. """
+        last_heartbeat = 0.0
+        while not self.shutdown_event.wait(self.control_interval):
+            try:
+                if time.time() - last_heartbeat >= self.heartbeat_interval:
+                    last_heartbeat = time.time()
+                    self.request_queue.heartbeat(self.owner)
+                    self.checkpoint.save_status(self.owner, self.report())
+                    reclaimed = self.request_queue.requeue_in_flight(self.lease)
+                    if reclaimed:
+                        log_event('crawl.reclaimed', f"Requeued {reclaimed} tasks of dead crawler processes",
+                                  count=reclaimed)
+                state, saved_at = self.checkpoint.load_state()
+                if state and saved_at > self._applied_at:
+                    self._applied_at = saved_at
+                    self._apply(state)
+            except Exception as e:
+                logger.error(f"Crawler control error: {e}")
+
+    def resize(self, num_workers):
+        """
+        Changes the number of worker threads while the pool is running. New workers start immediately; surplus
+        workers exit after finishing their current task.
+
+        Args:
+        num_workers (int): The new number of workers.
+
+        Returns:
+        int: The previous target number of workers.
+        """
+        with self.lock:
+            previous = self.num_workers
+            self.num_workers = num_workers
+            if self.state == 'stopped':
+                return previous
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            current = len(self.workers) - self._retiring
+            if num_workers > current:
+                # Cancel pending retirements first, then start new threads for the rest
+                cancelled = min(self._retiring, num_workers - current)
+                self._retiring -= cancelled
+                self._spawn(num_workers - current - cancelled)
+            elif num_workers < current:
+                self._retiring += current - num_workers
+        return previous
+
+    def _spawn(self, count):
+        """ Starts count worker threads. Must be called with the lock held. """
+        for _ in range(count):
+            worker = threading.Thread(target=self._run, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _should_retire(self):
+        """ Claims a pending retirement for the calling worker, if there is one. """
+        with self.lock:
+            if self._retiring > 0:
+                self._retiring -= 1
+                return True
+        return False
+
+    def save_checkpoint(self):
+        """ Persists the politeness schedule. The shared state is only written by the controls. """
+        self._last_checkpoint = time.time()
+        try:
+            self.checkpoint.save_hosts(self.politeness.snapshot())
+        except Exception as e:
+            logger.error(f"Failed to checkpoint crawler state: {e}")
+
+    def status(self):
+        """
+        Returns the pool state for monitoring.
+
+        Returns:
+        dict: The owner id, this process's state, live and target number of workers, queued, parked and
+        in-flight tasks of all processes, and the median latency and error rate of recent tasks.
+        """
+        if self.state == 'draining' and not any(worker.is_alive() for worker in self.workers):
+            self.state = 'stopped'
+        return {
+            'owner': self.owner,
+            'state': self.state,
+            'workers': sum(1 for worker in self.workers if worker.is_alive()),
+            'target_workers': self.num_workers,
+            'queued': self.request_queue.size(),
+            'delayed': self.request_queue.delayed_size(),
+            'in_flight': self.request_queue.redis.hlen(self.request_queue.in_flight_name),
+            **self.metrics.snapshot(),
+        }
+
+    def report(self):
+        """ Returns the status this process reports: its pool status and that of every registered reporter. """
+        return {'pool': self.status(), **{name: reporter() for name, reporter in self.reporters.items()}}
+
+    def processes(self):
+        """
+        Returns the status reported by every live crawler process, as stored by its control thread.
+
+        Returns:
+        dict: For each process id, its pool status under 'pool', the status of its other reporting services, such
+        as 'autoscaler', and the time it was reported under 'saved_at'.
+        """
+        return self.checkpoint.load_statuses(self.lease)
+
+    def progress(self):
+        """
+        Returns the crawl progress shared by every crawler process, which is the same whichever process asks, e.g. a
+        web process that does not crawl itself.
+
+        Returns:
+        dict: The state last requested through pause, resume, drain or stop_all ('stopped' if none was), the number
+        of queued tasks, of tasks parked until their host is ready, and of tasks in flight in any process.
+        """
+        state, _ = self.checkpoint.load_state()
+        return {
+            'state': state or 'stopped',
+            'queued': self.request_queue.size(),
+            'delayed': self.request_queue.delayed_size(),
+            'in_flight': self.request_queue.redis.hlen(self.request_queue.in_flight_name),
+        }
+
+    def _run(self):
+        """ Worker loop, run in each thread inside the application context. """
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                if self._should_retire():
+                    break
+                if not self.run_event.is_set():
+                    self.run_event.wait(self.idle_wait)
+                    continue
+
+                raw_task = self.request_queue.get_request(self.owner)
+                if raw_task is None:
+                    # A drain also waits for the tasks parked until their host is ready
+                    if self.state == 'draining' and self.request_queue.delayed_size() == 0:
+                        break
+                    self.stop_event.wait(self.idle_wait)
+                    continue
+
+                wait = self._process(raw_task)
+                if wait:
+                    self.request_queue.defer(raw_task, wait)
+                    continue
+                self.request_queue.ack(raw_task)
+
+                if time.time() - self._last_checkpoint >= self.checkpoint_interval:
+                    self.save_checkpoint()
+        if self.state == 'draining' and not any(
+                worker.is_alive() for worker in self.workers if worker is not threading.current_thread()):
+            self.state = 'stopped'
+            self.save_checkpoint()
+
+    def _process(self, raw_task):
+        """
+        Processes one raw task from the queue.
+
+        Args:
+        raw_task (str): The task in JSON format.
+
+        Returns:
+        float: The number of seconds until the task's host can be requested if the task was not run, otherwise 0.
+        """
+        try:
+            task = json.loads(raw_task)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error: {e}")
+            return 0
+
+        url = task.get('url')
+        if not url:
+            return 0
+        if self.checkpoint.seen_since(url, task.get('enqueued_at', 0), task.get('user_id')):
+            log_event('crawl.duplicate', f"Skipping {url}, already processed after it was enqueued", url=url)
+            return 0
+
+        wait = self.politeness.reserve(urlparse(url).netloc)
+        if wait > 0:
+            return wait
+
+        started = time.perf_counter()
+        try:
+            failed = self.handler(task) == 'failed'
+        except Exception as e:
+            # A bug in the handler says nothing about the host, so it does not count towards the error rate
+            logger.error(f"Unhandled error while processing {url}: {e}")
+            failed = False
+        self.metrics.record(time.perf_counter() - started, failed)
+        self.checkpoint.mark_seen(url, user_id=task.get('user_id'))
+        return 0
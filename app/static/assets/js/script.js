@@ -19,6 +19,25 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     });
 
+    // Logic to pause and resume the crawl; the pause is checkpointed on the server
+    document.getElementById('pause-crawl').addEventListener('click', function() {
+        fetch('/pause_crawling', { method: 'POST' })
+            .then(response => response.json())
+            .then(data => console.log(data))
+            .catch((error) => {
+                console.error('Error:', error);
+            });
+    });
+
+    document.getElementById('resume-crawl').addEventListener('click', function() {
+        fetch('/resume_crawling', { method: 'POST' })
+            .then(response => response.json())
+            .then(data => console.log(data))
+            .catch((error) => {
+                console.error('Error:', error);
+            });
+    });
+
     // Logic to enqueue URL
     document.getElementById('enqueue-form').addEventListener('submit', function(e) {
         e.preventDefault();
@@ -41,6 +60,27 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Live feed of crawl results and queue progress pushed by the server
+    var feed = document.getElementById('crawl-feed');
+    if (feed && window.EventSource) {
+        var source = new EventSource('/crawl/stream');
+        source.addEventListener('result', function(e) {
+            var result = JSON.parse(e.data);
+            var item = document.createElement('li');
+            item.textContent = result.status + ': ' + result.url + (result.title ? ' - ' + result.title : '');
+            feed.prepend(item);
+            // Keep the list bounded like the server-side buffer
+            while (feed.children.length > 100) {
+                feed.removeChild(feed.lastChild);
+            }
+        });
+        source.addEventListener('progress', function(e) {
+            var progress = JSON.parse(e.data);
+            document.getElementById('crawl-progress').textContent =
+                'Crawler ' + progress.state + ': ' + progress.queued + ' queued, ' + progress.in_flight + ' in progress';
+        });
+    }
+
     document.getElementById('download-data').addEventListener('click', function() {
         fetch('/download-my-data')  // Adjust this URL to your Flask route
             .then(response => {
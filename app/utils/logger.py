@@ -1,29 +1,227 @@
-"""
-This script sets up logging for the application. It configures a logger with two handlers: one for writing logs to a file and another for outputting logs to the console.
-
-- File logs: All log messages (including DEBUG level) are written to 'app.log'.
-- Console logs: Only ERROR (and more severe) log messages are printed to the console.
-
-This setup helps in monitoring and debugging the application by providing detailed logs and separating less critical logs (DEBUG) from more critical ones (ERROR).
-"""
-import logging
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-# Create a file handler
-fh = logging.FileHandler('app.log')
-fh.setLevel(logging.DEBUG)
-
-# Create a console handler
-ch = logging.StreamHandler()
-ch.setLevel(logging.ERROR)
-
-# Create a formatter and set it for both handlers
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-
-# Add handlers to the logger
-logger.addHandler(fh)
-logger.addHandler(ch)
+"""
+This script sets up logging for the application. Log calls never write to a file or the console themselves: records are put on an
+in-memory queue by a QueueHandler, and a single background QueueListener thread writes them out, so crawl threads do not contend
+on handler locks or stdout.
+
+- File logs: Records at LOG_LEVEL and above are written as one JSON object per line, rotated at LOG_MAX_BYTES with
+  LOG_BACKUP_COUNT old files kept. Each process writes a file named after LOG_FILE and its role (app.log -> app-web.log,
+  app-crawl.log, app-reparse.log). Further processes of the same role, such as gunicorn or reparse workers, take the
+  first free of app-web-2.log, app-web-3.log, ..., held with a lock for the life of the process. Processes never share
+  or rotate each other's file, and the number of files stays bounded by the processes running at once.
+- Console logs: Only ERROR (and more severe) log messages are printed to the console.
+- Sampling: High-volume event types can be sampled with LOG_SAMPLE_RATES, e.g. 'crawl.start=0.1,crawl.saved=0.5'.
+  Records without an event type, and WARNING or more severe records, are never sampled out.
+
+Use log_event() for structured records: log_event('crawl.saved', 'Saved page', url=url) adds 'event' and 'url' fields to the JSON record.
+Forked child processes inherit the parent's queue but not its listener thread, so logging is set up again in them.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from decouple import config
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks (Windows), every process of a role writes the role's file
+    fcntl = None
+
+LOG_LEVEL = config('LOG_LEVEL', default='DEBUG').upper()
+LOG_FILE = config('LOG_FILE', default='app.log')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+LOG_SAMPLE_RATES = config('LOG_SAMPLE_RATES', default='')
+LOG_ROLE = config('LOG_ROLE', default='web')
+
+# Attributes every LogRecord has; anything else on a record was passed through 'extra' and is emitted as a JSON field
+STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats a record as a single-line JSON object, including any fields passed through 'extra'. """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records of each sampled event type. Attached to the QueueHandler, so dropped records
+    are discarded in the calling thread before they are queued.
+
+    Attributes:
+    rates (dict): A mapping of event types to the fraction of their records to keep.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    A QueueHandler that keeps tracebacks as their own field. The standard prepare() folds the traceback into the
+    message and drops exc_info, which would leave the JSON formatter without an 'exc_info' field.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # The message is rendered and exc_info dropped so the record can be passed to another thread safely
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def parse_sample_rates(value):
+    """ Parses 'event=rate,event=rate' into a dict of event types to sampling rates. """
+    rates = {}
+    for item in value.split(','):
+        event, _, rate = item.partition('=')
+        if event.strip() and rate.strip():
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def claim_log_file(role):
+    """
+    Claims the first log file of a role that no running process holds.
+
+    Args:
+    role (str): The process role, e.g. 'web', 'crawl' or 'reparse'.
+
+    Returns:
+    tuple: The path of the log file, and the open lock file holding it (None without file locks). The lock is
+    released when the lock file is closed or the process exits.
+    """
+    root, ext = os.path.splitext(LOG_FILE)
+    slot = 1
+    while True:
+        path = f'{root}-{role}{ext}' if slot == 1 else f'{root}-{role}-{slot}{ext}'
+        if fcntl is None:
+            return path, None
+        lock = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return path, lock
+        except OSError:
+            lock.close()
+            slot += 1
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+fh = ch = log_queue = queue_handler = listener = log_lock = None
+
+
+def setup_logging():
+    """
+    Creates the handlers, queue and listener thread of the current process. Runs at import, again in forked
+    children, where the inherited listener thread does not exist and the parent's log file must not be shared, and
+    when the process role changes.
+    """
+    global fh, ch, log_queue, queue_handler, listener, log_lock
+    if queue_handler is not None:
+        logger.removeHandler(queue_handler)
+    # Drop this process's claim, or in a forked child its copy of the parent's, before claiming a file
+    if log_lock is not None:
+        log_lock.close()
+
+    # Create a rotating JSON file handler
+    path, log_lock = claim_log_file(LOG_ROLE)
+    fh = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
+    fh.setLevel(LOG_LEVEL)
+    fh.setFormatter(JsonFormatter())
+
+    # Create a console handler
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.ERROR)
+    ch.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    # Callers only enqueue records; the listener thread does all formatting and I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = TracebackQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, fh, ch, respect_handler_level=True)
+    listener.start()
+
+
+setup_logging()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=setup_logging)
+
+
+def set_log_role(role):
+    """
+    Switches the current process to the log file of another role, e.g. 'crawl' for the 'flask crawl' process.
+    Records logged before are flushed to the previous file first.
+
+    Args:
+    role (str): The new process role.
+
+    Returns:
+    None
+    """
+    global LOG_ROLE
+    if role == LOG_ROLE:
+        return
+    LOG_ROLE = role
+    stop_logging()
+    setup_logging()
+
+
+def stop_logging():
+    """ Flushes queued records and stops the listener thread. Safe to call more than once. """
+    if listener._thread is not None:
+        listener.stop()
+
+
+atexit.register(stop_logging)
+
+
+def log_event(event, message, level=logging.INFO, **fields):
+    """
+    Logs a structured record with an event type and extra fields.
+
+    Args:
+    event (str): The event type, used for sampling and emitted as the 'event' field.
+    message (str): The human-readable message.
+    level (int): The logging level. Defaults to INFO.
+    **fields: Extra fields emitted in the JSON record, e.g. url or user_id.
+
+    Returns:
+    None
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'event': event, **fields})
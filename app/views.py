@@ -1,353 +1,554 @@
-import os, json, time
-from threading import Thread, Event
-from flask import render_template, request, url_for, redirect, send_from_directory, jsonify, session, send_file
-from flask_login import login_user, logout_user, current_user, login_required
-from flask_wtf.csrf import generate_csrf
-from jinja2 import TemplateNotFound
-import pandas as pd
-from docx import Document
-from sqlalchemy import or_
-
-from . import app, lm, bc
-from app.forms import LoginForm, RegisterForm
-from app.models import Users, Data, CrawledData, db
-from app.services.queue_service import RequestQueue
-from app.services.crawler import WebCrawler, MEDIA_DIR
-from app.utils.text_sanitizer import sanitize_text
-
-
-request_queue = RequestQueue()
-
-stop_event = Event()
-
-results = []
-
-user_id = None
-
-def crawl_worker():
-    """
-    Worker function for handling crawl tasks.
-    
-    Continuously checks the request queue for new crawl tasks, processes them, 
-    and stores the results in the database.
-    """
-    while not stop_event.is_set():
-        if not request_queue.is_empty():
-            task = request_queue.get_request()
-            if task:
-                try:
-                    task = json.loads(task)
-                    print(f"Processing URL {task['url']} for user {task['user_id']}")
-                    # Process task...
-                    user_id = task['user_id']
-                    url = task['url'] 
-                    print(f'{url}: {user_id}')
-                    web_crawler = WebCrawler(url=task['url'])
-                    if url:
-                        try:
-                            result = web_crawler.crawl(task['url'])
-                            if result:
-                                print(f"retrieved results waiting to save in db {task['url']} {task['user_id']}")
-                                # Create an instance of CrawledData and populate its fields
-                                crawled_data = CrawledData( 
-                                    user_id=task['user_id'],
-                                    url=result['url'],
-                                    title=result['title'],
-                                    content=result['content'],
-                                    file_path=result['file_path'] if result['file_path'] else '',
-                                    content_type=result['content-type'],
-                                    links=','.join(result['links']) if result['links'] else ''  # Assuming the links column is a comma-separated string of links
-                                )
-                                print("crawl object created!")
-                                crawled_data.save()
-                                # flash("URL has been scraped", 'success')
-                                results.append(result)
-                        except Exception as e:
-                            print(f"An error occured: {e}")
-                except json.JSONDecodeError as e:
-                    print(f"JSON decode error: {e}")
-                    continue  # Skip to the next iteration if decoding fails
-
-
-@lm.user_loader
-def load_user(user_id):
-    """
-    Flask-Login user_loader callback.
-    
-    Loads a user from the database using the given user_id.
-    
-    :param user_id: int - The user's identifier.
-    :return: User object or None if the user doesn't exist.
-    """
-    return Users.query.get(int(user_id))
-
-
-@app.route('/logout')
-@login_required
-def logout():
-    """
-    Route to log out the current user.
-    
-    Ends the user's session and redirects to the index page.
-    """
-    logout_user()
-    return redirect(url_for('index'))
-
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    """
-    Route to handle user registration.
-    
-    GET: Renders the registration form.
-    POST: Processes the registration form and creates a new user.
-    :return: Redirection or JSON response with registration status.
-    """
-    if request.method == 'POST':
-        form = RegisterForm(request.form)
-
-        if form.validate_on_submit():
-            #Fitler data for existing users
-            user = Users.query.filter_by(user=form.username.data).first()
-            user_by_email = Users.query.filter_by(email=form.email.data).first()
-            if user or user_by_email is None:
-                pwd_hash = bc.generate_password_hash(form.password.data)
-                user = Users(firstname=form.firstname.data,
-                             lastname=form.lastname.data,
-                             user=form.username.data,
-                             password=pwd_hash,
-                             email=form.email.data)
-                user.save()
-                return redirect(url_for('index')), 201
-
-            elif user or user_by_email:
-                # flash("User already exists", 'error')
-                return jsonify({"message": "User already exists."}), 409
-        else:
-            return jsonify({"errors": form.errors}), 400
-        
-    else:
-        form = RegisterForm()
-        return render_template('register.html', form=form)
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    """
-    Route to handle user login.
-    
-    GET: Renders the login form.
-    POST: Authenticates the user and initiates a session.
-    :return: Redirection to the index page or rendering of login form with error.
-    """
-    if request.method == 'POST':
-        form = LoginForm(request.form)
-
-        if form.validate_on_submit():
-            username = Users.query.filter_by(user=form.username.data).first()
-            if username and bc.check_password_hash(username.password, form.password.data):
-                login_user(username, remember=form.remember.data)
-                user_id = username.id
-                # user_id = current_user.get_id()
-                return redirect(url_for('index'))
-            
-            else:
-                return render_template('login.html', form=form, error="Invalid credentials.")
-        else:
-            # flash("form errors: {}".format(form.errors), 'error')
-            return jsonify({"errors": form.errors}), 400
-    else:
-        form = LoginForm()
-        # session['csrf_token'] = generate_csrf()
-        return render_template('login.html', form=form)
-
-@app.route('/enqueue', methods=['POST'])
-@login_required
-def enqueue_url():
-    """
-    Route to enqueue a URL for crawling.
-    
-    Accepts a URL and optional content type, and adds it to the crawl queue.
-    :return: JSON response indicating the URL was added to the queue.
-    """
-    data = request.json
-    url = data.get('url')
-    content_type = data.get('content_type', 'other')  # Default to 'other' if not specified
-    user_id = current_user.get_id()  # Get user ID from the current_user
-    request_queue.add_request(user_id=user_id, url=url, content_type=content_type)
-    # flash("URL {} added to request queue".format(url), 'success')
-    return jsonify({"message": "URL added to queue", "url": url}), 200
-
-# Starting multiple worker threads for scalability
-num_worker_threads = 5  # Adjust this number based on your needs and server capacity
-workers = []
-def thread_with_context():
-    """
-    Wrapper function to run the crawl worker in a Flask application context.
-
-    No input parameters.
-    Outputs: None. The function works by side-effects, running the crawl worker.
-    """
-    with app.app_context():
-        crawl_worker()
-
-for _ in range(num_worker_threads):
-    thread = Thread(target=thread_with_context) 
-    thread.daemon = True
-    thread.start() 
-    workers.append(thread)
-
-# @app.route('/start_crawling', methods=['GET'])
-# @login_required
-# def start_crawling():
-#     # This endpoint could trigger the crawl process if not already running
-#     # For now, it just returns the status
-#     return jsonify({"message": "Crawler is running"}), 200
-
-@app.route('/download-my-data')
-@login_required
-def download_my_data():
-    """
-    Route to allow users to download their data.
-    
-    Fetches user-specific crawled data from the database and provides a Word document for download.
-    :return: Word document with user data or a 404 error if no data is available.
-    """
-    user_id = current_user.get_id()  # Get the current logged-in user's ID
-    data = CrawledData.query.filter_by(user_id=user_id).all()  # Fetch user-specific data
-
-    if not data:
-        app.logger.info("No data available")
-        # flash("No data available for user {}".format(user_id), 'warning')
-        app.logger.log(f"No data available for user {user_id}")
-        return "No data available", 404
-
-    # Create a Word document
-    doc = Document()
-    for item in data:
-        url = sanitize_text(item.url)
-        title = sanitize_text(item.title)
-        content = sanitize_text(item.content)
-        file_path = sanitize_text(item.file_path)
-        links = ', '.join(sanitize_text(link) for link in (item.links or '').split(','))
-
-        doc.add_heading('URL: ' + url, level=1)
-        doc.add_paragraph('Title: ' + title)
-        doc.add_paragraph('Content: ' + content)
-        doc.add_paragraph('File Path: ' + (file_path or 'N/A'))
-        doc.add_paragraph('Links: ' + ', '.join(links))
-
-    # Save the document to a temporary file
-    filename = f"user_data_{user_id}.docx"
-    file_path = os.path.join( MEDIA_DIR, filename)
-    print(file_path)
-    doc.save(file_path)
-
-    return send_file(file_path, as_attachment=True) #, attachment_filename=filename
-
-@app.route('/stop_crawling', methods=['POST'])
-@login_required
-def stop_crawling():
-    """
-    Stops the web crawling process. This route sets a stop event and joins all worker threads to ensure
-    the crawling process is cleanly terminated.
-
-    This route requires user authentication.
-
-    Method: POST
-    URL: /stop_crawling
-
-    Returns:
-        JSON response indicating the crawling process has been stopped.
-    """
-    # This endpoint will stop the crawling process
-    stop_event.set()
-    for worker in workers:
-        worker.join()  # Wait for threads to finish
-    # flash("Crawler has been stopped", 'success')
-    app.logger.warn("Crawler has been stopped")
-    return jsonify({"message": "Crawler has been stopped"}), 200
-
-@app.route('/crawler_control') 
-@login_required
-def crawler_control():
-     """
-    Presents the crawler control interface to the user. This route renders a template allowing 
-    authenticated users to control the web crawling process.
-
-    This route requires user authentication.
-
-    Method: GET
-    URL: /crawler_control
-
-    Returns:
-        Rendered HTML template for crawler control.
-    """
-     return render_template('crawl_data.html')
-
-@app.route('/', defaults={'path': 'index'}, methods=['GET', 'POST'])
-@app.route('/<path>', methods=['GET', 'POST'])
-def index(path):
-    """
-    The main index route for the application.
-    
-    If the user is authenticated, it will render search results based on a query or display 
-    all user-specific crawled data.
-    
-    If the user is not authenticated, it redirects to the login page.
-    
-    In case of template not found, it returns a 404 error page, and for other exceptions, 
-    it returns a 500 error page.
-    """
-    try:
-        if not current_user.is_authenticated:
-            # Redirect to the login page
-            return redirect(url_for('login'))
-
-        user_id = current_user.get_id()  # Get the current user's ID
-        db.session.expire_all()
-        query = request.args.get('search')  # Get the search term from the URL query parameters
-
-        if query:
-            search_term = f"%{query}%"  # Format the search term for partial matching
-            # Query for a partial match in either the title or the content_type
-            results = CrawledData.query.filter(
-                CrawledData.user_id == user_id,
-                or_(
-                    CrawledData.title.ilike(search_term),
-                    CrawledData.content_type.ilike(search_term)
-                )
-            ).all()
-        else:
-            # For a GET request or POST without a query, display all user-specific data
-            results = CrawledData.query.filter_by(user_id=user_id).all()
-
-        # Render the index page with the search results or all user-specific data
-        return render_template('index.html', results=results, query=query)
-
-    except TemplateNotFound:
-        # If the template is not found, render a 404 error page
-        return render_template('page-404.html'), 404
-    except Exception as e:
-        # Log the exception and render a 500 error page
-        app.logger.error(f'Error: {e}')
-        return render_template('page-500.html'), 500
-
-
-@app.route('/sitemap.xml')
-def sitemap():
-    """
-    Provides the sitemap.xml file. This route serves the sitemap.xml from the static directory of the 
-    application, typically used by search engines for crawling.
-
-    Method: GET
-    URL: /sitemap.xml
-
-    Returns:
-        sitemap.xml file from the static directory.
-    """
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'sitemap.xml')
-
-
-
-
+import os
+from datetime import datetime
+from flask import Blueprint, Response, current_app, stream_with_context, render_template, request, url_for, redirect, send_from_directory, jsonify, session, send_file
+from flask_login import login_user, logout_user, current_user, login_required
+from flask_wtf.csrf import generate_csrf
+from jinja2 import TemplateNotFound
+from sqlalchemy import or_
+
+from . import lm, bc
+from app.forms import LoginForm, RegisterForm
+from app.models import Users, Data, CrawledData, ExtractionProfile, db
+from app.services.crawl_services import get_services
+from app.utils.text_sanitizer import sanitize_text
+from app.utils.url_utils import is_valid_url
+from app.utils.logger import logger
+
+
+# Routes are registered on a blueprint so they can be attached to any application built by create_app()
+bp = Blueprint('main', __name__)
+
+
+@lm.user_loader
+def load_user(user_id):
+    """
+    Flask-Login user_loader callback.
+    
+    Loads a user from the database using the given user_id.
+    
+    :param user_id: int - The user's identifier.
+    :return: User object or None if the user doesn't exist.
+    """
+    return Users.query.get(int(user_id))
+
+
+@bp.route('/logout')
+@login_required
+def logout():
+    """
+    Route to log out the current user.
+    
+    Ends the user's session and redirects to the index page.
+    """
+    logout_user()
+    return redirect(url_for('main.index'))
+
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    """
+    Route to handle user registration.
+    
+    GET: Renders the registration form.
+    POST: Processes the registration form and creates a new user.
+    :return: Redirection or JSON response with registration status.
+    """
+    if request.method == 'POST':
+        form = RegisterForm(request.form)
+
+        if form.validate_on_submit():
+            #Fitler data for existing users
+            user = Users.query.filter_by(user=form.username.data).first()
+            user_by_email = Users.query.filter_by(email=form.email.data).first()
+            if user or user_by_email is None:
+                pwd_hash = bc.generate_password_hash(form.password.data)
+                user = Users(firstname=form.firstname.data,
+                             lastname=form.lastname.data,
+                             user=form.username.data,
+                             password=pwd_hash,
+                             email=form.email.data)
+                user.save()
+                return redirect(url_for('main.index')), 201
+
+            elif user or user_by_email:
+                # flash("User already exists", 'error')
+                return jsonify({"message": "User already exists."}), 409
+        else:
+            return jsonify({"errors": form.errors}), 400
+        
+    else:
+        form = RegisterForm()
+        return render_template('register.html', form=form)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    """
+    Route to handle user login.
+    
+    GET: Renders the login form.
+    POST: Authenticates the user and initiates a session.
+    :return: Redirection to the index page or rendering of login form with error.
+    """
+    if request.method == 'POST':
+        form = LoginForm(request.form)
+
+        if form.validate_on_submit():
+            username = Users.query.filter_by(user=form.username.data).first()
+            if username and bc.check_password_hash(username.password, form.password.data):
+                login_user(username, remember=form.remember.data)
+                user_id = username.id
+                # user_id = current_user.get_id()
+                return redirect(url_for('main.index'))
+            
+            else:
+                return render_template('login.html', form=form, error="Invalid credentials.")
+        else:
+            # flash("form errors: {}".format(form.errors), 'error')
+            return jsonify({"errors": form.errors}), 400
+    else:
+        form = LoginForm()
+        # session['csrf_token'] = generate_csrf()
+        return render_template('login.html', form=form)
+
+@bp.route('/enqueue', methods=['POST'])
+@login_required
+def enqueue_url():
+    """
+    Route to enqueue a URL for crawling.
+    
+    Accepts a URL and optional content type, and adds it to the crawl queue.
+    :return: JSON response indicating the URL was added to the queue.
+    """
+    data = request.json
+    url = data.get('url')
+    content_type = data.get('content_type', 'other')  # Default to 'other' if not specified
+    user_id = current_user.get_id()  # Get user ID from the current_user
+    get_services().request_queue.add_request(user_id=user_id, url=url, content_type=content_type)
+    # flash("URL {} added to request queue".format(url), 'success')
+    return jsonify({"message": "URL added to queue", "url": url}), 200
+
+@bp.route('/discover', methods=['POST'])
+@login_required
+def discover_sitemaps():
+    """
+    Route to seed the crawl queue from a site's sitemaps.
+
+    Accepts a URL on the target site, finds its sitemaps through robots.txt or well-known paths, and enqueues
+    every page they list in the background.
+    :return: JSON response indicating discovery has started.
+    """
+    data = request.json
+    url = data.get('url')
+    if not url or not is_valid_url(url):
+        return jsonify({"message": "Please provide a valid URL"}), 400
+    user_id = current_user.get_id()
+    get_services().sitemap_discovery.start(url, user_id)
+    return jsonify({"message": "Sitemap discovery started", "url": url}), 202
+
+@bp.route('/start_crawling', methods=['POST'])
+@login_required
+def start_crawling():
+    """
+    Resumes the crawl workers of every crawler process, restarting them after a stop or drain. The request is
+    published through Redis and applied by the crawler processes, such as 'flask crawl'. Only when START_CRAWLER is
+    set does this process crawl itself, in which case its crawl services are started first if they are not running.
+
+    Method: POST
+    URL: /start_crawling
+
+    Returns:
+        JSON response with the crawler status.
+    """
+    services = get_services()
+    requeued = services.start() if current_app.config['START_CRAWLER'] else 0
+    services.worker_pool.resume()
+    return jsonify({"message": "Crawler is running", "requeued": requeued, **services.worker_pool.progress()}), 200
+
+@bp.route('/pause_crawling', methods=['POST'])
+@login_required
+def pause_crawling():
+    """
+    Pauses the crawl workers of every crawler process. Each worker finishes its current task and then waits; the
+    pause is checkpointed, so a restarted crawler also starts paused.
+
+    Method: POST
+    URL: /pause_crawling
+
+    Returns:
+        JSON response with the crawler status.
+    """
+    worker_pool = get_services().worker_pool
+    worker_pool.pause()
+    return jsonify({"message": "Crawler has been paused", **worker_pool.progress()}), 200
+
+@bp.route('/resume_crawling', methods=['POST'])
+@login_required
+def resume_crawling():
+    """
+    Resumes the paused or stopped crawl workers of every crawler process.
+
+    Method: POST
+    URL: /resume_crawling
+
+    Returns:
+        JSON response with the crawler status.
+    """
+    worker_pool = get_services().worker_pool
+    worker_pool.resume()
+    return jsonify({"message": "Crawler has been resumed", **worker_pool.progress()}), 200
+
+@bp.route('/drain_crawling', methods=['POST'])
+@login_required
+def drain_crawling():
+    """
+    Lets the crawl workers of every crawler process finish every queued task and then stop.
+
+    Method: POST
+    URL: /drain_crawling
+
+    Returns:
+        JSON response with the crawler status.
+    """
+    worker_pool = get_services().worker_pool
+    worker_pool.drain()
+    return jsonify({"message": "Crawler is draining the queue", **worker_pool.progress()}), 200
+
+@bp.route('/crawler_status')
+@login_required
+def crawler_status():
+    """
+    Reports the requested crawler state, queued, parked and in-flight tasks, the live workers of every crawler
+    process in total and per process, and how many responses were skipped per reason by the response gate. The
+    per-process values are those reported by each crawler process in the last few seconds, so they are the same
+    whichever web process answers.
+
+    Method: GET
+    URL: /crawler_status
+
+    Returns:
+        JSON response with the crawler status.
+    """
+    services = get_services()
+    pools = {owner: status['pool'] for owner, status in services.worker_pool.processes().items()}
+    return jsonify({
+        **services.worker_pool.progress(),
+        "workers": sum(pool['workers'] for pool in pools.values()),
+        "processes": pools,
+        "skipped": services.skip_stats(),
+    }), 200
+
+@bp.route('/crawler/metrics')
+@login_required
+def crawler_metrics():
+    """
+    Reports, for every crawler process, the current size and recent metrics of its worker pool together with its
+    autoscaler's limits, last measurement (backlog, latency, error rate, CPU and RSS) and recent scaling
+    decisions. Crawler processes such as 'flask crawl' report these through Redis every few seconds, so any web
+    process can serve them.
+
+    Method: GET
+    URL: /crawler/metrics
+
+    Returns:
+        JSON response with the shared crawl progress and the pool and autoscaler status of each crawler process.
+    """
+    worker_pool = get_services().worker_pool
+    return jsonify({**worker_pool.progress(), "processes": worker_pool.processes()}), 200
+
+@bp.route('/crawler/profiler', methods=['GET', 'POST'])
+@login_required
+def crawler_profiler():
+    """
+    Reports or toggles the crawl task profiler. A toggle is published through Redis and applied within a second by
+    every crawler process, including separate 'flask crawl' workers. While enabled, a fraction of crawl tasks has
+    its stacks sampled, and the samples are written per stage and host as collapsed-stack files under PROFILE_DIR.
+
+    Method: GET, POST
+    URL: /crawler/profiler
+    Body (POST): {"enabled": true, "sample_rate": 0.05}
+
+    Returns:
+        JSON response with the status of this process's profiler and the published setting.
+    """
+    profiler = get_services().profiler
+    if request.method == 'POST':
+        data = request.json or {}
+        sample_rate = data.get('sample_rate')
+        if sample_rate is not None and (isinstance(sample_rate, bool)
+                                        or not isinstance(sample_rate, (int, float))):
+            return jsonify({"message": "sample_rate must be a number between 0 and 1"}), 400
+        enabled = bool(data.get('enabled', True))
+        profiler.publish(enabled, sample_rate)
+        logger.info(f"Profiler {'enabled' if enabled else 'disabled'} by user {current_user.get_id()}")
+    return jsonify(profiler.status()), 200
+
+@bp.route('/extraction/profiles', methods=['GET'])
+@login_required
+def list_extraction_profiles():
+    """
+    Lists the extraction profiles owned by the current user.
+
+    Method: GET
+    URL: /extraction/profiles
+
+    Returns:
+        JSON response with the user's profiles.
+    """
+    profiles = ExtractionProfile.query.filter_by(user_id=current_user.id).order_by(ExtractionProfile.domain).all()
+    return jsonify({"profiles": [profile.to_dict() for profile in profiles]}), 200
+
+@bp.route('/extraction/profiles', methods=['POST'])
+@login_required
+def save_extraction_profile():
+    """
+    Creates or replaces the current user's extraction profile of a domain, which is applied to the pages of that
+    domain the user crawls. The rules are compiled before they are stored, so an invalid selector or expression is
+    rejected here rather than failing during the crawl.
+
+    Method: POST
+    URL: /extraction/profiles
+    Body: {"domain": "example.com", "rules": [{"name": "price", "type": "css", "expr": "span.price"}], "enabled": true}
+
+    Returns:
+        JSON response with the stored profile, or an error message.
+    """
+    from app.services.extraction import CompiledProfile, normalize_domain
+
+    data = request.json or {}
+    domain = normalize_domain(data.get('domain') or '')
+    rules = data.get('rules')
+    if not domain or not isinstance(rules, list):
+        return jsonify({"message": "Please provide a domain and a list of rules"}), 400
+    try:
+        CompiledProfile(domain, rules)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    profile = ExtractionProfile.query.filter_by(user_id=current_user.id, domain=domain).first()
+    if profile is None:
+        profile = ExtractionProfile(current_user.id, domain, rules, enabled=bool(data.get('enabled', True)))
+        db.session.add(profile)
+    else:
+        profile.rules = rules
+        profile.enabled = bool(data.get('enabled', True))
+        profile.updated_at = datetime.utcnow()
+    db.session.commit()
+    get_services().extraction_profiles.invalidate(current_user.id, domain)
+    return jsonify({"message": "Extraction profile saved", "profile": profile.to_dict()}), 200
+
+@bp.route('/extraction/profiles/<domain>', methods=['DELETE'])
+@login_required
+def delete_extraction_profile(domain):
+    """
+    Deletes the current user's extraction profile of a domain.
+
+    Method: DELETE
+    URL: /extraction/profiles/<domain>
+
+    Returns:
+        JSON response indicating whether the profile was deleted.
+    """
+    from app.services.extraction import normalize_domain
+
+    domain = normalize_domain(domain)
+    profile = ExtractionProfile.query.filter_by(domain=domain, user_id=current_user.id).first()
+    if profile is None:
+        return jsonify({"message": "No extraction profile for this domain"}), 404
+    db.session.delete(profile)
+    db.session.commit()
+    get_services().extraction_profiles.invalidate(current_user.id, domain)
+    return jsonify({"message": "Extraction profile deleted", "domain": domain}), 200
+
+@bp.route('/extraction/stats')
+@login_required
+def extraction_stats():
+    """
+    Reports how often each rule of the current user's extraction profiles ran and how long it took, slowest rules
+    first, so an expensive selector can be found. The figures are kept in Redis and cover every crawler process.
+
+    Method: GET
+    URL: /extraction/stats
+
+    Returns:
+        JSON response with per-rule call counts, errors and total, mean and maximum time in milliseconds.
+    """
+    return jsonify({"rules": get_services().extraction_profiles.stats.snapshot(current_user.id)}), 200
+
+@bp.route('/crawl/stream')
+@login_required
+def crawl_stream():
+    """
+    Streams the current user's crawl results and queue progress as server-sent events.
+
+    On connect the client receives the results buffered since the event id in its Last-Event-ID header (or all
+    buffered results), then new results as workers publish them, and a 'progress' event every few seconds.
+
+    Method: GET
+    URL: /crawl/stream
+
+    Returns:
+        A text/event-stream response that stays open until the client disconnects.
+    """
+    user_id = current_user.get_id()
+    services = get_services()
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+
+    events = services.result_feed.stream(user_id, last_event_id, progress=services.worker_pool.progress)
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/download-my-data')
+@login_required
+def download_my_data():
+    """
+    Route to allow users to download their data.
+    
+    Fetches user-specific crawled data from the database and provides a Word document for download.
+    :return: Word document with user data or a 404 error if no data is available.
+    """
+    # python-docx is only needed here, so it is imported on first use rather than at startup
+    from docx import Document
+    from app.services.crawler import MEDIA_DIR
+
+    user_id = current_user.get_id()  # Get the current logged-in user's ID
+    data = CrawledData.query.filter_by(user_id=user_id).all()  # Fetch user-specific data
+
+    if not data:
+        # flash("No data available for user {}".format(user_id), 'warning')
+        logger.info(f"No data available for user {user_id}")
+        return "No data available", 404
+
+    # Create a Word document
+    doc = Document()
+    for item in data:
+        url = sanitize_text(item.url)
+        title = sanitize_text(item.title)
+        content = sanitize_text(item.content)
+        file_path = sanitize_text(item.file_path)
+        links = ', '.join(sanitize_text(link) for link in (item.links or '').split(','))
+
+        doc.add_heading('URL: ' + url, level=1)
+        doc.add_paragraph('Title: ' + title)
+        doc.add_paragraph('Content: ' + content)
+        doc.add_paragraph('File Path: ' + (file_path or 'N/A'))
+        doc.add_paragraph('Links: ' + ', '.join(links))
+
+    # Save the document to a temporary file
+    filename = f"user_data_{user_id}.docx"
+    file_path = os.path.join( MEDIA_DIR, filename)
+    doc.save(file_path)
+
+    return send_file(file_path, as_attachment=True) #, attachment_filename=filename
+
+@bp.route('/stop_crawling', methods=['POST'])
+@login_required
+def stop_crawling():
+    """
+    Stops the web crawling process. The workers of every crawler process finish their current task and exit,
+    and the politeness schedule is checkpointed. The crawler can be started again with /start_crawling or
+    /resume_crawling.
+
+    This route requires user authentication.
+
+    Method: POST
+    URL: /stop_crawling
+
+    Returns:
+        JSON response indicating the crawling process has been stopped.
+    """
+    # This endpoint will stop the crawling process
+    get_services().worker_pool.stop_all()
+    # flash("Crawler has been stopped", 'success')
+    logger.warning("Crawler has been stopped")
+    return jsonify({"message": "Crawler has been stopped"}), 200
+
+@bp.route('/crawler_control') 
+@login_required
+def crawler_control():
+     """
+    Presents the crawler control interface to the user. This route renders a template allowing 
+    authenticated users to control the web crawling process.
+
+    This route requires user authentication.
+
+    Method: GET
+    URL: /crawler_control
+
+    Returns:
+        Rendered HTML template for crawler control.
+    """
+     return render_template('crawl_data.html')
+
+@bp.route('/', defaults={'path': 'index'}, methods=['GET', 'POST'])
+@bp.route('/<path>', methods=['GET', 'POST'])
+def index(path):
+    """
+    The main index route for the application.
+    
+    If the user is authenticated, it will render search results based on a query or display 
+    all user-specific crawled data.
+    
+    If the user is not authenticated, it redirects to the login page.
+    
+    In case of template not found, it returns a 404 error page, and for other exceptions, 
+    it returns a 500 error page.
+    """
+    try:
+        if not current_user.is_authenticated:
+            # Redirect to the login page
+            return redirect(url_for('main.login'))
+
+        user_id = current_user.get_id()  # Get the current user's ID
+        db.session.expire_all()
+        query = request.args.get('search')  # Get the search term from the URL query parameters
+
+        if query:
+            search_term = f"%{query}%"  # Format the search term for partial matching
+            # Query for a partial match in either the title or the content_type
+            results = CrawledData.query.filter(
+                CrawledData.user_id == user_id,
+                or_(
+                    CrawledData.title.ilike(search_term),
+                    CrawledData.content_type.ilike(search_term)
+                )
+            ).all()
+        else:
+            # For a GET request or POST without a query, display all user-specific data
+            results = CrawledData.query.filter_by(user_id=user_id).all()
+
+        # Render the index page with the search results or all user-specific data
+        return render_template('index.html', results=results, query=query)
+
+    except TemplateNotFound:
+        # If the template is not found, render a 404 error page
+        return render_template('page-404.html'), 404
+    except Exception as e:
+        # Log the exception and render a 500 error page
+        logger.error(f'Error: {e}')
+        return render_template('page-500.html'), 500
+
+
+@bp.route('/sitemap.xml')
+def sitemap():
+    """
+    Provides the sitemap.xml file. This route serves the sitemap.xml from the static directory of the 
+    application, typically used by search engines for crawling.
+
+    Method: GET
+    URL: /sitemap.xml
+
+    Returns:
+        sitemap.xml file from the static directory.
+    """
+    return send_from_directory(os.path.join(current_app.root_path, 'static'), 'sitemap.xml')
+
+
+
+
@@ -0,0 +1,93 @@
+"""
+Measures cold-start time of the web and worker processes.
+
+Each scenario runs in a fresh Python interpreter, so module caches from earlier runs do not hide import costs. The
+wall-clock time of every run is recorded and the minimum and median are reported, in milliseconds.
+
+Scenarios:
+- models: importing the models, as CLI tools and tests do.
+- web: building the application with create_app() without starting the crawler, as a web worker does.
+- worker: building the application and the crawl services a worker process needs, including the crawler module.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--json] [--importtime SCENARIO]
+
+--importtime prints the slowest modules of one scenario, taken from 'python -X importtime'.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = {
+    'models': "import app.models",
+    'web': "from app import create_app; create_app(start_services=False)",
+    'worker': (
+        "from app import create_app; from app.services.crawl_services import get_services; "
+        "services = get_services(create_app(start_services=False)); services.worker_pool; "
+        "import app.services.crawler"
+    ),
+}
+
+
+def run_once(code, extra_args=()):
+    """ Runs code in a fresh interpreter and returns (elapsed seconds, stderr). """
+    env = dict(os.environ, START_CRAWLER='False')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, *extra_args, '-c', code], cwd=ROOT, env=env,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    return elapsed, completed.stderr
+
+
+def bench(runs):
+    """ Times every scenario, returning {scenario: {'min_ms', 'median_ms'}}. """
+    baseline = [run_once('pass')[0] for _ in range(runs)]
+    results = {'interpreter': {'min_ms': min(baseline) * 1000, 'median_ms': statistics.median(baseline) * 1000}}
+    for name, code in SCENARIOS.items():
+        timings = [run_once(code)[0] for _ in range(runs)]
+        results[name] = {'min_ms': min(timings) * 1000, 'median_ms': statistics.median(timings) * 1000}
+    return results
+
+
+def slowest_imports(scenario, top=15):
+    """ Returns the modules with the highest cumulative import time for a scenario. """
+    _, stderr = run_once(SCENARIOS[scenario], ('-X', 'importtime'))
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Runs per scenario.')
+    parser.add_argument('--json', action='store_true', help='Print results as a single JSON line.')
+    parser.add_argument('--importtime', choices=sorted(SCENARIOS), help='Show the slowest imports of a scenario.')
+    args = parser.parse_args()
+
+    if args.importtime:
+        for cumulative_us, module in slowest_imports(args.importtime):
+            print(f'{cumulative_us / 1000:9.1f} ms  {module}')
+        return
+
+    results = bench(args.runs)
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, timing in results.items():
+        print(f"{name:12} min {timing['min_ms']:8.1f} ms   median {timing['median_ms']:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
 """
 This script serves as the entry point for the Flask application.
 
-It imports the 'app' and 'db' objects from the 'app' package, which are essential for starting and running the Flask application. 
-The 'app' object represents the Flask application instance, while 'db' is the SQLAlchemy database instance.
+It builds the application with the 'create_app' factory from the 'app' package. The 'app' object represents the Flask application
+instance, while 'db' is the SQLAlchemy database instance.
 
-To run the application, this script should be executed. When it's run, it will start the Flask web server and initialize the database, making the application ready to receive and respond to HTTP requests.
+To run the application, this script should be executed (or pointed to with FLASK_APP=run.py). When it's run, it will start the Flask web server
+and initialize the database, making the application ready to receive and respond to HTTP requests. The crawl workers run separately
+with 'flask crawl', or in the web process from its first request when START_CRAWLER is set to True. Other CLI commands that load this
+application ('flask reparse', 'flask shell', 'flask routes') never start them.
 
 Ensure that all necessary configurations and initializations are completed in the 'app' package before running this script.
 """
-from app import app, db
\ No newline at end of file
+from app import create_app, db
+
+app = create_app()